@@ -0,0 +1,245 @@
+"""Throughput, latency and memory benchmarks for the repository implementations.
+
+Seeds a dedicated benchmark database with users, categories, expenses and
+chats, then times the main repository operations and prints (or writes) a
+JSON report that can be diffed across versions:
+
+    python benchmarks/bench_repositories.py --database expenses_bench \
+        --expenses 1000000 --chats 1000000 --output bench_output.json
+
+With --backend sqlite the same run needs no server at all. The seeded
+tables are dropped and recreated, so the database name (or SQLite path)
+must contain "bench" unless --force is given.
+"""
+from datetime import datetime
+from datetime import timezone
+from expenses_entities import ChatHistory
+from expenses_entities import Expense
+from expenses_persistence import ChatHistoryRepositoryImplementation
+from expenses_persistence import ConnectionPool
+from expenses_persistence import ExpenseRepositoryImplementation
+from expenses_persistence import SQLiteBackend
+from expenses_persistence import create_schema
+from importlib.metadata import PackageNotFoundError
+from importlib.metadata import version
+from typing import Any
+from typing import Callable
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+WORDS = ('rent', 'groceries', 'coffee', 'fuel', 'internet', 'gym', 'books', 'travel', 'dinner', 'gift')
+
+
+def new_expense(rng: random.Random, users: int, categories: int) -> Expense:
+    return Expense(expense_id=None,
+                   expense_name=f'{rng.choice(WORDS)} {rng.randrange(1000)}',
+                   expense_amount=round(rng.uniform(1, 500), 2),
+                   month_year=f'{rng.randint(2020, 2025)}-{rng.randint(1, 12):02d}',
+                   user_id=rng.randint(1, users),
+                   exp_category_id=rng.randint(1, categories),
+                   category_name=None,
+                   status=None,
+                   created_at=None,
+                   updated_at=None)
+
+
+def new_chat(rng: random.Random, users: int) -> ChatHistory:
+    return ChatHistory(chat_id=None,
+                       user_id=rng.randint(1, users),
+                       content=' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 80))),
+                       role_id=rng.randint(1, 2),
+                       status=None,
+                       created_at=None,
+                       updated_at=None)
+
+
+def seed(pool: ConnectionPool,
+         expenses: ExpenseRepositoryImplementation,
+         chats: ChatHistoryRepositoryImplementation,
+         args: argparse.Namespace,
+         rng: random.Random) -> None:
+    with pool.connection() as connection, connection.cursor() as cursor:
+        cursor.executemany('INSERT INTO `users` (`username`, `password`) VALUES (%s, %s)',
+                           [(f'user{index}', 'x' * 60) for index in range(args.users)])
+        cursor.executemany('INSERT INTO `expense_categories` (`category_name`) VALUES (%s)',
+                           [(f'category{index}',) for index in range(args.categories)])
+
+    for start in range(0, args.expenses, args.batch_size):
+        count = min(args.batch_size, args.expenses - start)
+        expenses.add_batch([new_expense(rng, args.users, args.categories) for _ in range(count)])
+    for start in range(0, args.chats, args.batch_size):
+        count = min(args.batch_size, args.chats - start)
+        chats.add_batch([new_chat(rng, args.users) for _ in range(count)])
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(len(ordered) * percent / 100) - 1))
+    return ordered[index]
+
+
+def measure(name: str, operation: Callable[[], Any], iterations: int) -> dict[str, Any]:
+    result = {'operation': name, 'iterations': iterations}
+    samples = []
+    try:
+        # Memory is measured on a separate call because tracemalloc slows
+        # every allocation down and would distort the timings.
+        gc.collect()
+        tracemalloc.start()
+        operation()
+        result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        for _ in range(iterations):
+            started = time.perf_counter()
+            operation()
+            samples.append(time.perf_counter() - started)
+    except Exception as error:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        result['error'] = f'{type(error).__name__}: {error}'
+        return result
+
+    result.update({
+        'ops_per_sec': len(samples) / sum(samples) if sum(samples) else None,
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000
+    })
+    return result
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    rng = random.Random(args.seed)
+    if args.backend == 'sqlite':
+        pool = ConnectionPool(backend=SQLiteBackend(args.sqlite_path), min_size=1, max_size=2)
+    else:
+        pool = ConnectionPool(host=args.host, user=args.user, password=args.password,
+                              db_name=args.database, db_port=args.port, min_size=1, max_size=2)
+    expenses = ExpenseRepositoryImplementation(pool=pool)
+    chats = ChatHistoryRepositoryImplementation(pool=pool)
+
+    seed_started = time.perf_counter()
+    if not args.skip_seed:
+        create_schema(pool, drop_existing=True)
+        seed(pool, expenses, chats, args, rng)
+    seed_seconds = time.perf_counter() - seed_started
+
+    # Only chats inserted by this run are deleted, so the seeded rows the
+    # read benchmarks use stay intact across runs with --skip-seed.
+    newest = chats.get_by(fields=('chat_id',), order_by='-chat_id', limit=1)
+    first_new_chat_id = newest[0].chat_id + 1 if newest else 0
+    chats_to_delete = []
+
+    def add_chat_batch():
+        batch = [new_chat(rng, args.users) for _ in range(args.batch_size)]
+        chats.add_batch(batch)
+
+    def delete_chat_batch():
+        chunk, chats_to_delete[:] = chats_to_delete[:args.batch_size], chats_to_delete[args.batch_size:]
+        chats.delete_batch(chunk)
+
+    iterations = args.iterations
+    bulk_iterations = max(1, iterations // 100)
+    results = [
+        measure('expenses.get', lambda: expenses.get(rng.randint(1, max(args.expenses, 1))), iterations),
+        measure('expenses.get_by', lambda: expenses.get_by(user_id=rng.randint(1, args.users)), iterations),
+        measure('expenses.get_all', expenses.get_all, args.scan_iterations),
+        measure('expenses.add', lambda: expenses.add(new_expense(rng, args.users, args.categories)), iterations),
+        measure('expenses.add_batch',
+                lambda: expenses.add_batch([new_expense(rng, args.users, args.categories)
+                                            for _ in range(args.batch_size)]),
+                bulk_iterations),
+        measure('chats.get', lambda: chats.get(rng.randint(1, max(args.chats, 1))), iterations),
+        measure('chats.get_by', lambda: chats.get_by(user_id=rng.randint(1, args.users)), iterations),
+        measure('chats.get_all', chats.get_all, args.scan_iterations),
+        measure('chats.add', lambda: chats.add(new_chat(rng, args.users)), iterations),
+        measure('chats.add_batch', add_chat_batch, bulk_iterations)
+    ]
+
+    # measure() makes one untimed call for the memory figure on top of the
+    # timed iterations, and each call deletes a full batch.
+    added = chats.get_by(fields=('chat_id',), chat_id__gte=first_new_chat_id, order_by='chat_id',
+                         limit=(bulk_iterations + 1) * args.batch_size)
+    chats_to_delete.extend(chat.chat_id for chat in added or [])
+    results.append(measure('chats.delete_batch', delete_chat_batch, bulk_iterations))
+
+    expenses.close()
+    chats.close()
+    pool_stats = pool.stats().as_dict()
+    pool.close()
+
+    try:
+        package_version = version('expenses_persistence')
+    except PackageNotFoundError:
+        package_version = 'unknown'
+
+    return {
+        'package_version': package_version,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'password'},
+        'seed_seconds': seed_seconds,
+        'pool': pool_stats,
+        'results': results
+    }
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=('mysql', 'sqlite'), default='mysql')
+    parser.add_argument('--sqlite-path', default='expenses_bench.sqlite3')
+    parser.add_argument('--host', default=os.environ.get('BENCH_DB_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('BENCH_DB_PORT', '3306')))
+    parser.add_argument('--user', default=os.environ.get('BENCH_DB_USER', 'root'))
+    parser.add_argument('--password', default=os.environ.get('BENCH_DB_PASSWORD', ''))
+    parser.add_argument('--database', default=os.environ.get('BENCH_DB_NAME', 'expenses_bench'))
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--expenses', type=int, default=100000)
+    parser.add_argument('--chats', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--scan-iterations', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the tables from a previous run')
+    parser.add_argument('--force', action='store_true', help='allow a database name without "bench"')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    target = args.sqlite_path if args.backend == 'sqlite' else args.database
+    if 'bench' not in target and not args.force:
+        parser.error(f'refusing to drop tables in {target!r}; use a *bench* database or --force')
+    return args
+
+
+def main(argv: list[str] = None) -> None:
+    args = parse_args(argv)
+    result = run(args)
+    report = json.dumps(result, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        print(report)
+
+    # The report is still written so the error details are kept, but a run
+    # where an operation failed must not pass for a valid measurement.
+    failed = [f'{item["operation"]}: {item["error"]}' for item in result['results'] if 'error' in item]
+    if failed:
+        sys.exit('Benchmark operations failed:\n  ' + '\n  '.join(failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,56 @@ from .expense_repo import ExpenseRepositoryImplementation
 from .expense_repo import ExpenseCategoriesRepositoryImplementation
 from .expense_repo import UserRepositoryImplementation
 from .expense_repo import ChatHistoryRepositoryImplementation
+from .backends import MySQLBackend
+from .backends import SQLiteBackend
+from .cache import CategoryCache
+from .cache import ChatTailCache
+from .dashboard import Dashboard
+from .dashboard import DashboardLoader
+from .instrumentation import Instrumentation
+from .instrumentation import LatencyHistogram
+from .instrumentation import QueryEvent
+from .pagination import ChangeBatch
+from .pagination import InvalidPageToken
+from .pagination import Page
+from .pool import ConnectionPool
+from .pool import PoolError
+from .pool import PoolStats
+from .pool import PoolTimeoutError
+from .replicas import ReplicaRouter
+from .reporting import ExpenseTotal
+from .schema import check_schema
+from .schema import create_indexes
+from .schema import create_schema
+from .unit_of_work import UnitOfWork
+from .write_behind import BufferFullError
+from .write_behind import ChatWriteBuffer
 
-__all__ = ['ChatHistoryRepositoryImplementation',
+__all__ = ['BufferFullError',
+           'CategoryCache',
+           'ChangeBatch',
+           'ChatHistoryRepositoryImplementation',
+           'ChatTailCache',
+           'ChatWriteBuffer',
+           'ConnectionPool',
+           'Dashboard',
+           'DashboardLoader',
            'ExpenseRepositoryImplementation',
            'ExpenseCategoriesRepositoryImplementation',
-           'UserRepositoryImplementation']
-
+           'ExpenseTotal',
+           'Instrumentation',
+           'InvalidPageToken',
+           'LatencyHistogram',
+           'MySQLBackend',
+           'Page',
+           'PoolError',
+           'PoolStats',
+           'PoolTimeoutError',
+           'QueryEvent',
+           'ReplicaRouter',
+           'SQLiteBackend',
+           'UnitOfWork',
+           'UserRepositoryImplementation',
+           'check_schema',
+           'create_indexes',
+           'create_schema']
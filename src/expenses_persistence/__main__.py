@@ -0,0 +1,50 @@
+from .backends import SQLiteBackend
+from .pool import ConnectionPool
+from .schema import TABLE_NAMES
+from .schema import check_schema
+from .schema import create_schema
+
+import argparse
+import os
+import sys
+
+
+def _parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m expenses_persistence',
+                                     description='Create the expenses schema or check its query plans.')
+    parser.add_argument('command', choices=('create', 'check'))
+    parser.add_argument('--drop-existing', action='store_true', help='drop the tables before creating them')
+    parser.add_argument('--backend', choices=('mysql', 'sqlite'), default='mysql')
+    parser.add_argument('--sqlite-path', default='expenses.sqlite3')
+    parser.add_argument('--host', default=os.environ.get('EXPENSES_DB_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('EXPENSES_DB_PORT', '3306')))
+    parser.add_argument('--user', default=os.environ.get('EXPENSES_DB_USER', 'root'))
+    parser.add_argument('--password', default=os.environ.get('EXPENSES_DB_PASSWORD', ''))
+    parser.add_argument('--database', default=os.environ.get('EXPENSES_DB_NAME', 'expenses'))
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    args = _parse_args(argv)
+    if args.backend == 'sqlite':
+        pool = ConnectionPool(backend=SQLiteBackend(args.sqlite_path), min_size=1, max_size=1)
+    else:
+        pool = ConnectionPool(host=args.host, user=args.user, password=args.password,
+                              db_name=args.database, db_port=args.port, min_size=1, max_size=1)
+
+    with pool:
+        if args.command == 'create':
+            create_schema(pool, drop_existing=args.drop_existing)
+            print(f'Schema ready: {", ".join(TABLE_NAMES)}')
+            return 0
+
+        results = check_schema(pool)
+    for name, scans in results.items():
+        print(f'{"SLOW" if scans else "ok  "}  {name}')
+        for scan in scans:
+            print(f'      {scan}')
+    return 1 if any(results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,407 @@
+from expenses_entities import Expense
+from expenses_entities import ExpenseCategory
+from expenses_entities import User
+from expenses_entities import ChatHistory
+from .expense_repo import ChatHistoryRepositoryImplementation
+from .expense_repo import ExpenseCategoriesRepositoryImplementation
+from .expense_repo import ExpenseRepositoryImplementation
+from .expense_repo import UserRepositoryImplementation
+from .expense_repo import _chunks
+from .mappers import row_mapper
+from typing import Any
+from typing import Iterable
+
+import aiomysql
+
+
+async def create_pool(host: str,
+                      user: str,
+                      password: str,
+                      db_name: str,
+                      db_port: int,
+                      min_size: int = 1,
+                      max_size: int = 10,
+                      max_idle: float = 300.0,
+                      **connect_kwargs) -> aiomysql.Pool:
+    return await aiomysql.create_pool(
+        host=host,
+        user=user,
+        password=password,
+        db=db_name,
+        port=db_port,
+        minsize=min_size,
+        maxsize=max_size,
+        pool_recycle=max_idle,
+        **{'autocommit': True, **connect_kwargs}
+    )
+
+
+class _AsyncPooledRepository:
+    # The SQL and filters are shared with the synchronous repositories, so
+    # both read the same columns and accept the same get_by keys.
+    def __init__(self, pool: aiomysql.Pool):
+        self._pool = pool
+
+    async def _end_read(self, connection: aiomysql.Connection) -> None:
+        # Pools from create_pool run in autocommit mode, so a SELECT needs no
+        # COMMIT round trip. Without autocommit it leaves a read snapshot
+        # open; end it so the next borrower sees fresh data.
+        if not connection.get_autocommit():
+            await connection.rollback()
+
+    async def _fetch_one(self, query: str, params: tuple, entity_type: type) -> Any:
+        async with self._pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(query, params)
+                result = await cursor.fetchone()
+                column_names = tuple(column[0] for column in cursor.description)
+            await self._end_read(connection)
+
+        if not result:
+            return None
+
+        return row_mapper(entity_type, column_names)(result)
+
+    async def _fetch_all(self, query: str, params: tuple, entity_type: type) -> list[Any]:
+        async with self._pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(query, params)
+                result = await cursor.fetchall()
+                column_names = tuple(column[0] for column in cursor.description)
+            await self._end_read(connection)
+
+        if not result:
+            return []
+
+        return list(map(row_mapper(entity_type, column_names), result))
+
+    async def _execute(self, query: str, params: tuple) -> tuple[int, Any]:
+        async with self._pool.acquire() as connection:
+            try:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(query, params)
+                    rows_affected = cursor.rowcount
+                    last_id = cursor.lastrowid
+                # A lone statement is already durable in autocommit mode.
+                if not connection.get_autocommit():
+                    await connection.commit()
+            except BaseException:
+                await connection.rollback()
+                raise
+        return rows_affected, last_id
+
+    async def _execute_many(self, query: str, params: list[tuple]) -> int:
+        async with self._pool.acquire() as connection:
+            await connection.begin()
+            try:
+                async with connection.cursor() as cursor:
+                    rows = await cursor.executemany(query, params)
+                await connection.commit()
+            except BaseException:
+                await connection.rollback()
+                raise
+        return rows
+
+    async def _execute_statements(self, statements: Iterable[tuple[str, tuple]]) -> list[tuple[int, Any]]:
+        # All statements run on one connection and commit together, so a
+        # failing chunk rolls back the whole batch.
+        results = []
+        async with self._pool.acquire() as connection:
+            await connection.begin()
+            try:
+                async with connection.cursor() as cursor:
+                    for query, params in statements:
+                        await cursor.execute(query, params)
+                        results.append((cursor.rowcount, cursor.lastrowid))
+                await connection.commit()
+            except BaseException:
+                await connection.rollback()
+                raise
+        return results
+
+
+class AsyncExpenseRepositoryImplementation(_AsyncPooledRepository):
+    _select_query = ExpenseRepositoryImplementation._select_query
+    _get_condition = ExpenseRepositoryImplementation._get_condition
+    _filters = ExpenseRepositoryImplementation._filters
+
+    async def get(self, id) -> Expense:
+        query = self._select_query + self._get_condition
+        expense = await self._fetch_one(query, (id,), Expense)
+        return expense
+
+    async def get_by(self, **kwargs) -> list[Expense]:
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
+        expenses = await self._fetch_all(query, filters.params, Expense)
+
+        if len(expenses) == 0:
+            return None
+
+        return expenses
+
+    async def get_all(self) -> list[Expense]:
+        expenses = await self._fetch_all(self._select_query, (), Expense)
+
+        if len(expenses) == 0:
+            return None
+
+        return expenses
+
+    async def add(self, entity: Expense) -> Any:
+        query = '''
+        INSERT INTO `expenses`
+            (`expense_name`, `expense_amount`, `month_year`, `exp_category_id`, `user_id`)
+        VALUES
+            (%s, %s, %s, %s, %s)
+        '''
+        params = (entity.expense_name, entity.expense_amount,
+                  entity.month_year, entity.exp_category_id, entity.user_id)
+
+        _, id = await self._execute(query, params)
+        return id
+
+    async def add_batch(self, entities: list[Expense], chunk_size: int = 1000) -> list[Any]:
+        chunks, statements = ExpenseRepositoryImplementation._add_batch_statements(entities, chunk_size)
+
+        # Each chunk's ids are consecutive from its lastrowid, as in the
+        # synchronous add_batch.
+        ids = []
+        for chunk, (_, first_id) in zip(chunks, await self._execute_statements(statements)):
+            ids.extend(range(first_id, first_id + len(chunk)))
+        return ids
+
+    async def update(self, id, entity: Expense) -> bool:
+        query = '''
+        UPDATE `expenses`
+        SET `expense_name` = %s,
+            `expense_amount` = %s,
+            `month_year` = %s,
+            `exp_category_id` = %s
+        WHERE `expense_id` = %s
+        '''
+        params = (entity.expense_name, entity.expense_amount, entity.month_year, entity.exp_category_id, id)
+        rows_affected, _ = await self._execute(query, params)
+        return rows_affected > 0
+
+    async def delete(self, id) -> bool:
+        query = '''
+        DELETE FROM `expenses`
+        WHERE `expense_id` = %s
+        '''
+        params = (id,)
+        rows_affected, _ = await self._execute(query, params)
+        return rows_affected > 0
+
+
+class AsyncExpenseCategoriesRepositoryImplementation(_AsyncPooledRepository):
+    _select_query = ExpenseCategoriesRepositoryImplementation._select_query
+    _get_condition = ExpenseCategoriesRepositoryImplementation._get_condition
+    _filters = ExpenseCategoriesRepositoryImplementation._filters
+
+    async def get(self, id) -> ExpenseCategory:
+        query = self._select_query + self._get_condition
+        category = await self._fetch_one(query, (id,), ExpenseCategory)
+        return category
+
+    async def get_by(self, **kwargs) -> list[ExpenseCategory]:
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
+        categories = await self._fetch_all(query, filters.params, ExpenseCategory)
+
+        return categories
+
+    async def get_all(self) -> list[ExpenseCategory]:
+        categories = await self._fetch_all(self._select_query, (), ExpenseCategory)
+
+        return categories
+
+    async def add(self, entity: ExpenseCategory) -> Any:
+        _, id = await self._execute(
+            '''
+            INSERT INTO `expense_categories`
+                (`exp_category_id`, `category_name`)
+            VALUES
+                (%s, %s)
+            ''',
+            (entity.exp_category_id, entity.category_name)
+        )
+        return id
+
+    async def update(self, id, entity: ExpenseCategory) -> bool:
+        rows_affected, _ = await self._execute(
+            '''
+            UPDATE `expense_categories`
+            SET `category_name` = %s
+            WHERE `exp_category_id` = %s
+            ''',
+            (entity.category_name, id)
+        )
+        return rows_affected > 0
+
+    async def delete(self, id) -> bool:
+        rows_affected, _ = await self._execute(
+            '''
+            DELETE FROM `expense_categories`
+            WHERE `exp_category_id` = %s
+            ''',
+            (id,)
+        )
+        return rows_affected > 0
+
+
+class AsyncUserRepositoryImplementation(_AsyncPooledRepository):
+    _select_query = UserRepositoryImplementation._select_query
+    _get_condition = UserRepositoryImplementation._get_condition
+    _filters = UserRepositoryImplementation._filters
+
+    async def get(self, id) -> User:
+        query = self._select_query + self._get_condition
+        user = await self._fetch_one(query, (id,), User)
+        return user
+
+    async def get_by(self, **kwargs) -> list[User]:
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
+        users = await self._fetch_all(query, filters.params, User)
+
+        if len(users) == 0:
+            return None
+
+        return users
+
+    async def get_all(self) -> list[User]:
+        users = await self._fetch_all(self._select_query, (), User)
+
+        if len(users) == 0:
+            return None
+
+        return users
+
+    async def add(self, entity: User) -> Any:
+        query = '''
+        INSERT INTO `users`
+            (`username`, `password`)
+        VALUES
+            (%s, %s)
+        '''
+        params = (entity.username, entity.password)
+
+        _, id = await self._execute(query, params)
+        return id
+
+    async def update(self, id, entity: User) -> bool:
+        query = '''
+        UPDATE `users`
+        SET `username` = %s,
+            `password` = %s
+        WHERE `user_id` = %s
+        '''
+
+        params = (entity.username, entity.password, id)
+
+        rows_affected, _ = await self._execute(query, params)
+        return rows_affected > 0
+
+    async def delete(self, id) -> bool:
+        query = '''
+        DELETE FROM `users`
+        WHERE `user_id` = %s
+        '''
+        params = (id,)
+
+        rows_affected, _ = await self._execute(query, params)
+        return rows_affected > 0
+
+
+class AsyncChatHistoryRepositoryImplementation(_AsyncPooledRepository):
+    _select_query = ChatHistoryRepositoryImplementation._select_query
+    _get_condition = ChatHistoryRepositoryImplementation._get_condition
+    _filters = ChatHistoryRepositoryImplementation._filters
+
+    async def get(self, id) -> ChatHistory:
+        query = self._select_query + self._get_condition
+        chat = await self._fetch_one(query, (id,), ChatHistory)
+        return chat
+
+    async def get_by(self, **kwargs) -> list[ChatHistory]:
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
+        chats = await self._fetch_all(query, filters.params, ChatHistory)
+
+        if len(chats) == 0:
+            return None
+
+        return chats
+
+    async def get_all(self) -> list[ChatHistory]:
+        chats = await self._fetch_all(self._select_query, (), ChatHistory)
+
+        if len(chats) == 0:
+            return None
+
+        return chats
+
+    async def add(self, entity: ChatHistory) -> Any:
+        query = '''
+        INSERT INTO `chats`
+            (`user_id`, `role_id`, `content`)
+        VALUES
+            (%s, %s, %s)
+        '''
+        params = (entity.user_id, entity.role_id, entity.content)
+
+        _, id = await self._execute(query, params)
+        return id
+
+    async def add_batch(self, entities: list[ChatHistory]) -> Any:
+        query = '''
+        INSERT INTO `chats`
+            (`user_id`, `role_id`, `content`)
+        VALUES
+            (%s, %s, %s)
+        '''
+        params = [(entity.user_id, entity.role_id, entity.content) for entity in entities]
+
+        rows = await self._execute_many(query, params)
+        if rows is None:
+            return None
+        if rows == 0:
+            return None
+
+        return rows
+
+    async def update(self, id, entity: ChatHistory) -> bool:
+        query = '''
+        UPDATE `chats`
+        SET `user_id` = %s,
+            `role_id` = %s,
+            `content` = %s
+        WHERE `chat_id` = %s
+        '''
+        params = (entity.user_id, entity.role_id, entity.content, id)
+
+        rows_affected, _ = await self._execute(query, params)
+        return rows_affected > 0
+
+    async def delete(self, id) -> bool:
+        query = '''
+        DELETE FROM `chats`
+        WHERE `chat_id` = %s
+        '''
+        params = (id,)
+
+        rows_affected, _ = await self._execute(query, params)
+        return rows_affected > 0
+
+    async def delete_batch(self, chat_ids: list[Any], chunk_size: int = 1000) -> bool:
+        statements = []
+        for chunk in _chunks(list(dict.fromkeys(chat_ids)), chunk_size):
+            query = f'''
+            DELETE FROM `chats`
+            WHERE `chat_id` IN ({', '.join(['%s'] * len(chunk))})
+            '''
+            statements.append((query, tuple(chunk)))
+
+        rows = sum(rows for rows, _ in await self._execute_statements(statements))
+        return rows > 0
@@ -0,0 +1,205 @@
+from functools import lru_cache
+from pymysql.connections import Connection
+from pymysql.constants import CLIENT
+from pymysql.err import InterfaceError
+from pymysql.err import OperationalError
+from typing import Any
+from typing import Iterable
+
+import pymysql
+import re
+import sqlite3
+
+# Client errors raised when the server went away or could not be reached:
+# CR_CONN_HOST_ERROR, CR_SERVER_GONE_ERROR, CR_SERVER_LOST and
+# CR_SERVER_LOST_EXTENDED.
+_MYSQL_DISCONNECT_CODES = frozenset((2003, 2006, 2013, 2055))
+
+
+class MySQLBackend:
+    name = 'mysql'
+    single_connection = False
+
+    def __init__(self,
+                 host: str,
+                 user: str,
+                 password: str,
+                 db_name: str,
+                 db_port: int,
+                 **connect_kwargs):
+        self._host = host
+        self._user = user
+        self._password = password
+        self._db_name = db_name
+        self._db_port = db_port
+        # Autocommit keeps reads and single-statement writes out of explicit
+        # transactions; multi-statement work opens one with begin().
+        self._connect_kwargs = {'autocommit': True, **connect_kwargs}
+
+    @property
+    def supports_multi_statements(self) -> bool:
+        # pymysql only accepts several statements per execute() when the
+        # connection was opened with client_flag=CLIENT.MULTI_STATEMENTS.
+        return bool(self._connect_kwargs.get('client_flag', 0) & CLIENT.MULTI_STATEMENTS)
+
+    def connect(self) -> Connection:
+        return pymysql.connect(
+            host=self._host,
+            user=self._user,
+            password=self._password,
+            database=self._db_name,
+            port=self._db_port,
+            **self._connect_kwargs
+        )
+
+    def is_disconnect(self, error: BaseException) -> bool:
+        if isinstance(error, InterfaceError):
+            return True
+        return (isinstance(error, OperationalError)
+                and bool(error.args) and error.args[0] in _MYSQL_DISCONNECT_CODES)
+
+    def seconds_ago(self) -> str:
+        # The server clock, not the client's, decides which rows are old
+        # enough; the %s takes the number of seconds.
+        return 'CURRENT_TIMESTAMP - INTERVAL %s SECOND'
+
+    def upsert_clause(self, key_column: str, columns: Iterable[str]) -> str:
+        assignments = ',\n                '.join([f'`{column}` = VALUES(`{column}`)' for column in columns])
+        return f'''
+            ON DUPLICATE KEY UPDATE
+                {assignments}
+            '''
+
+
+_PLACEHOLDER = re.compile(r'%(s|%)')
+
+
+@lru_cache(maxsize=1024)
+def _to_qmark(query: str) -> str:
+    # The repositories are written with pymysql's %s placeholders; sqlite3
+    # expects qmark style.
+    return _PLACEHOLDER.sub(lambda match: '?' if match.group(1) == 's' else '%', query)
+
+
+class SQLiteCursor:
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+        self._lastrowid = None
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> Any:
+        return self._lastrowid
+
+    def execute(self, query: str, args: Any = None) -> int:
+        self._cursor.execute(_to_qmark(query), () if args is None else args)
+        # MySQL reports the first id of a multi-row INSERT while SQLite
+        # reports the last one; the repositories rely on MySQL's behaviour.
+        self._lastrowid = self._cursor.lastrowid
+        if self._lastrowid and self._cursor.rowcount > 1 and query.lstrip()[:6].upper() == 'INSERT':
+            self._lastrowid -= self._cursor.rowcount - 1
+        return self._cursor.rowcount
+
+    def executemany(self, query: str, args: Iterable[Any]) -> int:
+        self._cursor.executemany(_to_qmark(query), args)
+        self._lastrowid = self._cursor.lastrowid
+        return self._cursor.rowcount
+
+    def fetchone(self) -> tuple:
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = None) -> list[tuple]:
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self) -> list[tuple]:
+        return self._cursor.fetchall()
+
+    def close(self) -> None:
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class SQLiteConnection:
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+
+    def cursor(self, cursor_type: type = None) -> SQLiteCursor:
+        # sqlite3 cursors already step through results lazily, so the
+        # unbuffered cursor type requested for streaming needs no mapping.
+        return SQLiteCursor(self._connection.cursor())
+
+    def begin(self) -> None:
+        self._connection.execute('BEGIN')
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def rollback(self) -> None:
+        self._connection.rollback()
+
+    def get_autocommit(self) -> bool:
+        return True
+
+    def ping(self, reconnect: bool = False) -> None:
+        self._connection.execute('SELECT 1').fetchone()
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    supports_multi_statements = False
+
+    def __init__(self, path: str, timeout: float = 5.0, wal: bool = True):
+        self._path = path
+        self._timeout = timeout
+        self._wal = wal
+
+    @property
+    def single_connection(self) -> bool:
+        # Every connection to ':memory:' opens its own empty database, so a
+        # pool must keep exactly one connection open for the data to survive.
+        return self._path == ':memory:'
+
+    def connect(self) -> SQLiteConnection:
+        # Pooled connections are handed to one thread at a time, so the
+        # same-thread check is relaxed; isolation_level=None gives
+        # autocommit with explicit BEGIN, matching the MySQL backend.
+        connection = sqlite3.connect(self._path,
+                                     timeout=self._timeout,
+                                     isolation_level=None,
+                                     check_same_thread=False)
+        if self._wal and self._path != ':memory:':
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        return SQLiteConnection(connection)
+
+    def is_disconnect(self, error: BaseException) -> bool:
+        # An embedded database has no connection to lose.
+        return False
+
+    def seconds_ago(self) -> str:
+        # Same UTC text format as the CURRENT_TIMESTAMP column defaults.
+        return "datetime('now', '-' || %s || ' seconds')"
+
+    def upsert_clause(self, key_column: str, columns: Iterable[str]) -> str:
+        assignments = ',\n                '.join([f'`{column}` = excluded.`{column}`' for column in columns])
+        return f'''
+            ON CONFLICT (`{key_column}`) DO UPDATE SET
+                {assignments}
+            '''
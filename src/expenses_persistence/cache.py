@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from collections import deque
+from expenses_entities import ChatHistory
+from expenses_entities import ExpenseCategory
+from typing import Any
+
+import threading
+import time
+
+
+class CategoryCache:
+    def __init__(self, ttl: float = 300.0, max_size: int = 1024):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self._ttl = ttl
+        self._max_size = max_size
+        # exp_category_id -> (category, expires_at), least recently used first.
+        self._entries: OrderedDict[Any, tuple[ExpenseCategory, float]] = OrderedDict()
+        self._all: tuple[list[ExpenseCategory], float] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, id) -> ExpenseCategory:
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(id)
+            self.hits += 1
+            return entry[0]
+
+    def get_all(self) -> list[ExpenseCategory]:
+        with self._lock:
+            if self._all is None or self._all[1] <= time.monotonic():
+                self._all = None
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(self._all[0])
+
+    def _put(self, category: ExpenseCategory, expires_at: float) -> None:
+        self._entries[category.exp_category_id] = (category, expires_at)
+        self._entries.move_to_end(category.exp_category_id)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def put(self, category: ExpenseCategory) -> None:
+        with self._lock:
+            self._put(category, time.monotonic() + self._ttl)
+
+    def put_all(self, categories: list[ExpenseCategory]) -> None:
+        with self._lock:
+            expires_at = time.monotonic() + self._ttl
+            for category in categories:
+                self._put(category, expires_at)
+            # A snapshot larger than the bound could not be served consistently
+            # from the per-id entries, so only small tables get a full snapshot.
+            if len(categories) <= self._max_size:
+                self._all = (list(categories), expires_at)
+
+    def invalidate(self, id=None) -> None:
+        with self._lock:
+            if id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(id, None)
+            self._all = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ChatTailCache:
+    def __init__(self, size: int = 50, max_users: int = 10000):
+        if size < 1 or max_users < 1:
+            raise ValueError('size and max_users must be at least 1')
+        self._size = size
+        self._max_users = max_users
+        # user_id -> (chronological tail, whether it holds the user's whole
+        # history), least recently used user first.
+        self._tails: OrderedDict[Any, tuple[deque[ChatHistory], bool]] = OrderedDict()
+        # Every change to a user's chats takes the next tick of the clock. A
+        # load is refused when its user changed after the read behind it
+        # started; users whose tick is forgotten to bound memory raise the
+        # floor instead, which refuses every load started before that tick.
+        self._clock = 0
+        self._floor = 0
+        self._changed: OrderedDict[Any, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __contains__(self, user_id) -> bool:
+        with self._lock:
+            return user_id in self._tails
+
+    def generation(self) -> int:
+        # Taken before reading the rows passed to load().
+        with self._lock:
+            return self._clock
+
+    def get(self, user_id, count: int) -> list[ChatHistory]:
+        with self._lock:
+            entry = self._tails.get(user_id)
+            if entry is None:
+                return None
+            tail, complete = entry
+            if count > len(tail) and not complete:
+                return None
+            self._tails.move_to_end(user_id)
+            return list(tail)[-count:] if count else []
+
+    def _store(self, user_id, chats: list[ChatHistory], complete: bool) -> None:
+        self._tails[user_id] = (deque(chats[-self._size:], maxlen=self._size), complete)
+        self._tails.move_to_end(user_id)
+        while len(self._tails) > self._max_users:
+            self._tails.popitem(last=False)
+
+    def _change(self, user_id) -> None:
+        self._clock += 1
+        self._changed[user_id] = self._clock
+        self._changed.move_to_end(user_id)
+        while len(self._changed) > self._max_users:
+            _, tick = self._changed.popitem(last=False)
+            self._floor = max(self._floor, tick)
+
+    def load(self, user_id, chats: list[ChatHistory], complete: bool, generation: int) -> bool:
+        with self._lock:
+            if generation < self._floor or self._changed.get(user_id, 0) > generation:
+                return False
+            self._store(user_id, chats, complete)
+            return True
+
+    def append(self, user_id, chats: list[ChatHistory]) -> None:
+        # Committed rows, read back after the insert. A concurrent load may
+        # already hold some of them, and concurrent sessions may append out
+        # of order, so the tail is merged by id and re-sorted.
+        with self._lock:
+            self._change(user_id)
+            entry = self._tails.get(user_id)
+            if entry is None or not chats:
+                return
+            tail, complete = entry
+            merged = {chat.chat_id: chat for chat in tail}
+            merged.update((chat.chat_id, chat) for chat in chats)
+            if complete and len(merged) > self._size:
+                complete = False
+            self._store(user_id, sorted(merged.values(), key=lambda chat: (chat.created_at, chat.chat_id)), complete)
+
+    def invalidate(self, user_id=None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._clock += 1
+                self._floor = self._clock
+                self._changed.clear()
+                self._tails.clear()
+            else:
+                self._change(user_id)
+                self._tails.pop(user_id, None)
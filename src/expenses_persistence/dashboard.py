@@ -0,0 +1,115 @@
+from .cache import CategoryCache
+from .expense_repo import ChatHistoryRepositoryImplementation
+from .expense_repo import ExpenseCategoriesRepositoryImplementation
+from .expense_repo import ExpenseRepositoryImplementation
+from .expense_repo import UserRepositoryImplementation
+from .instrumentation import Instrumentation
+from .instrumentation import query_timer
+from .mappers import row_mapper
+from .pool import ConnectionPool
+from .replicas import ReplicaRouter
+from dataclasses import dataclass
+from dataclasses import field
+from expenses_entities import ChatHistory
+from expenses_entities import Expense
+from expenses_entities import ExpenseCategory
+from expenses_entities import User
+from pymysql.connections import Connection
+from typing import Any
+
+
+@dataclass
+class Dashboard:
+    user: User = None
+    expenses: list[Expense] = field(default_factory=list)
+    categories: list[ExpenseCategory] = field(default_factory=list)
+    chats: list[ChatHistory] = field(default_factory=list)
+
+
+class DashboardLoader:
+    def __init__(self,
+                 pool: ConnectionPool | ReplicaRouter,
+                 instrumentation: Instrumentation = None,
+                 category_cache: CategoryCache = None,
+                 chat_limit: int = 20):
+        if chat_limit < 0:
+            raise ValueError('chat_limit must not be negative')
+        self._pool = pool
+        self._instrumentation = instrumentation
+        self._category_cache = category_cache
+        self._chat_limit = chat_limit
+
+    def _statements(self, user_id, month_year, categories: bool) -> list[tuple[str, str, tuple, type]]:
+        user_filter = UserRepositoryImplementation._filters.build({'user_id': user_id})
+        expense_filter = ExpenseRepositoryImplementation._filters.build({'user_id': user_id, 'month_year': month_year})
+        statements = [
+            ('user', UserRepositoryImplementation._select_query + user_filter.sql, user_filter.params, User),
+            ('expenses', ExpenseRepositoryImplementation._select_query + expense_filter.sql, expense_filter.params,
+             Expense),
+            ('chats', ChatHistoryRepositoryImplementation._recent_query, (user_id, self._chat_limit), ChatHistory)
+        ]
+        if categories:
+            statements.append(('categories', ExpenseCategoriesRepositoryImplementation._select_query, (),
+                               ExpenseCategory))
+        return statements
+
+    def _run_batched(self, connection: Connection, statements: list, timer: Any) -> list[tuple]:
+        # One execute() sends every statement; the server answers with one
+        # result set per statement, read in order with nextset().
+        query = ';\n'.join(query.strip() for _, query, _, _ in statements)
+        params = tuple(param for _, _, statement_params, _ in statements for param in statement_params)
+        results = []
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            timer.mark('execute')
+            while True:
+                results.append(([column[0] for column in cursor.description], cursor.fetchall()))
+                if not cursor.nextset():
+                    break
+            timer.mark('fetch')
+        return results
+
+    def _run_sequential(self, connection: Connection, statements: list, timer: Any) -> list[tuple]:
+        # Without multi-statement support the statements still share one
+        # pooled connection, so the load costs a single checkout.
+        results = []
+        with connection.cursor() as cursor:
+            for _, query, params, _ in statements:
+                cursor.execute(query, params)
+                timer.mark('execute')
+                results.append(([column[0] for column in cursor.description], cursor.fetchall()))
+                timer.mark('fetch')
+        return results
+
+    def load(self, user_id, month_year) -> Dashboard:
+        # Inside a unit of work the categories are read with the transaction,
+        # and uncommitted ones are kept out of the shared cache.
+        category_cache = self._category_cache if self._pool.bound_connection() is None else None
+        categories = category_cache.get_all() if category_cache is not None else None
+        statements = self._statements(user_id, month_year, categories is None)
+        query = ';\n'.join(query for _, query, _, _ in statements)
+
+        with query_timer(self._instrumentation, type(self).__name__, query) as timer:
+            with self._pool.connection(read_only=True) as connection:
+                timer.mark('pool_wait')
+                if self._pool.backend.supports_multi_statements:
+                    results = self._run_batched(connection, statements, timer)
+                else:
+                    results = self._run_sequential(connection, statements, timer)
+
+            loaded = {}
+            for (name, _, _, entity_type), (column_names, rows) in zip(statements, results):
+                timer.count(len(rows))
+                loaded[name] = list(map(row_mapper(entity_type, tuple(column_names)), rows))
+            timer.mark('mapping')
+
+        if categories is None:
+            categories = loaded['categories']
+            if category_cache is not None:
+                category_cache.put_all(categories)
+
+        loaded['chats'].reverse()
+        return Dashboard(user=loaded['user'][0] if loaded['user'] else None,
+                         expenses=loaded['expenses'],
+                         categories=categories,
+                         chats=loaded['chats'])
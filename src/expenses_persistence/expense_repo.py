@@ -6,35 +6,440 @@ from expenses_entities import ChatHistoryRepository
 from expenses_entities import ExpenseRepository
 from expenses_entities import ExpenseCategoriesRepository
 from expenses_entities import UserRepository
+from .cache import CategoryCache
+from .cache import ChatTailCache
+from .export import EXPENSE_ARROW_TYPES
+from .export import FORMATS
+from .export import open_writer
+from .filters import Filter
+from .filters import FilterBuilder
+from .instrumentation import Instrumentation
+from .instrumentation import query_timer
+from .mappers import projection_type
+from .mappers import row_mapper
+from .mappers import to_columns
+from .pagination import BACKWARD
+from .pagination import ChangeBatch
+from .pagination import FORWARD
+from .pagination import Page
+from .pagination import decode_token
+from .pagination import encode_token
+from .pool import ConnectionPool
+from .replicas import ReplicaRouter
+from .reporting import ExpenseTotal
+from .reporting import GROUP_BY_COLUMNS
+from .unit_of_work import UnitOfWork
+from .unit_of_work import after_commit
+from contextlib import contextmanager
 from pymysql.connections import Connection
+from pymysql.cursors import SSCursor
 from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import Sequence
+
+import time
+
+
+def _chunks(items: list[Any], size: int) -> Iterator[list[Any]]:
+    if size < 1:
+        raise ValueError('chunk size must be at least 1')
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class _PooledRepository:
+    # Reads are retried this many times, with exponential backoff, when the
+    # connection was lost under them (server restart, wait_timeout).
+    _read_retries = 2
+    _retry_backoff = 0.05
+
+    def _init_pool(self,
+                   pool: ConnectionPool | ReplicaRouter,
+                   instrumentation: Instrumentation = None,
+                   pool_size: int = 1) -> None:
+        self._instrumentation = instrumentation
+        self._owns_pool = pool is None
+        # Every call checks a connection out of the pool, so one instance can
+        # be shared between threads; pool_size bounds how many of them query
+        # at the same time.
+        if pool is None:
+            pool = ConnectionPool(
+                host=self._host,
+                user=self._user,
+                password=self._password,
+                db_name=self._db_name,
+                db_port=self._db_port,
+                min_size=1,
+                max_size=pool_size,
+                lazy=True
+            )
+        self._pool = pool
+
+    def _timer(self, query: str) -> Any:
+        return query_timer(self._instrumentation, type(self).__name__, query)
+
+    def transaction(self, timeout: float = None) -> UnitOfWork:
+        return UnitOfWork(self._pool, timeout=timeout)
+
+    @contextmanager
+    def _transaction(self, connection: Connection) -> Iterator[Connection]:
+        # Inside a unit of work the statements simply join its transaction.
+        if self._pool.bound_connection() is connection:
+            yield connection
+            return
+
+        connection.begin()
+        yield connection
+        connection.commit()
+
+    def _commit(self, connection: Connection) -> None:
+        # Pooled connections run in autocommit mode, so a lone statement is
+        # already durable; only pools configured otherwise need the commit.
+        if self._pool.bound_connection() is None and not connection.get_autocommit():
+            connection.commit()
+
+    def _retry_read(self, read: Callable[[], Any]) -> Any:
+        # The pool discards a connection whose rollback fails, so each retry
+        # runs on a fresh one. Inside a unit of work the transaction is gone
+        # with the connection, and the error is left to the caller.
+        delay = self._retry_backoff
+        for attempt in range(self._read_retries + 1):
+            try:
+                return read()
+            except Exception as error:
+                if (attempt == self._read_retries
+                        or self._pool.bound_connection() is not None
+                        or not self._pool.backend.is_disconnect(error)):
+                    raise
+            time.sleep(delay)
+            delay *= 2
+
+    def _query(self, query: str, params: tuple, timer: Any, primary: bool = False) -> tuple[list[str], tuple]:
+        # primary keeps a read off the replicas, for reads that decide what
+        # a following write does.
+        def read() -> tuple[list[str], tuple]:
+            with self._pool.connection(read_only=not primary) as connection:
+                timer.mark('pool_wait')
+                with connection.cursor() as cursor:
+                    cursor.execute(query, params)
+                    timer.mark('execute')
+                    result = cursor.fetchall()
+                    column_names = [column[0] for column in cursor.description]
+                    timer.mark('fetch')
+            return column_names, result
+
+        column_names, result = self._retry_read(read)
+        timer.count(len(result))
+        return column_names, result
+
+    def _fetch_rows(self, query: str, params: tuple, primary: bool = False) -> tuple[list[str], tuple]:
+        with self._timer(query) as timer:
+            return self._query(query, params, timer, primary)
+
+    def _fetch_one(self, query: str, params: tuple, entity_type: type) -> Any:
+        with self._timer(query) as timer:
+            def read() -> tuple[list[str], tuple]:
+                with self._pool.connection(read_only=True) as connection:
+                    timer.mark('pool_wait')
+                    with connection.cursor() as cursor:
+                        cursor.execute(query, params)
+                        timer.mark('execute')
+                        result = cursor.fetchone()
+                        column_names = [column[0] for column in cursor.description]
+                        timer.mark('fetch')
+                return column_names, result
+
+            column_names, result = self._retry_read(read)
+
+            if result is None:
+                return None
+
+            if len(result) == 0:
+                return None
+
+            timer.count(1)
+            entity = row_mapper(entity_type, tuple(column_names))(result)
+            timer.mark('mapping')
+            return entity
+
+    def _fetch_all(self, query: str, params: tuple, entity_type: type, primary: bool = False) -> list[Any]:
+        with self._timer(query) as timer:
+            column_names, result = self._query(query, params, timer, primary)
+
+            if result is None:
+                return []
+
+            entities = list(map(row_mapper(entity_type, tuple(column_names)), result))
+            timer.mark('mapping')
+            return entities
+
+    def _project(self, entity_type: type, fields: Sequence[str], kwargs: dict[str, Any]) -> list[tuple]:
+        # Only the requested columns go over the wire, and rows come back as
+        # named tuples rather than full entities.
+        if isinstance(fields, str):
+            fields = (fields,)
+        fields = tuple(fields)
+        filters = self._filters.build(kwargs)
+        query = f'''
+        SELECT
+            {self._filters.select(fields)}
+        {self._from_query}
+        ''' + filters.sql
+
+        with self._timer(query) as timer:
+            column_names, result = self._query(query, filters.params, timer)
+            row_type = projection_type(entity_type, tuple(column_names))
+            rows = list(map(row_type._make, result))
+            timer.mark('mapping')
+            return rows
+
+    def get_columns(self, use_numpy: bool = False, **kwargs) -> dict[str, Sequence[Any]]:
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
+
+        column_names, result = self._fetch_rows(query, filters.params)
+        return to_columns(column_names, result, use_numpy=use_numpy)
+
+    def _get_many(self,
+                  query: str,
+                  key_column: str,
+                  key_name: str,
+                  ids: Iterable[Any],
+                  fetch: Callable[[str, tuple], list[Any]],
+                  chunk_size: int) -> dict[Any, Any]:
+        found = {}
+        for chunk in _chunks(list(dict.fromkeys(ids)), chunk_size):
+            chunk_query = query + f' WHERE {key_column} IN ({", ".join(["%s"] * len(chunk))})'
+            for entity in fetch(chunk_query, tuple(chunk)):
+                found[getattr(entity, key_name)] = entity
+        return found
+
+    def _iterate(self, query: str, params: tuple, entity_type: type, chunk_size: int) -> Iterator[list[Any]]:
+        # The timer is created here, not in the generator, so it is
+        # attributed to the public method rather than to the consumer.
+        return self._iterate_chunks(self._timer(query), query, params, entity_type, chunk_size)
+
+    def _iterate_chunks(self,
+                        timer: Any,
+                        query: str,
+                        params: tuple,
+                        entity_type: type,
+                        chunk_size: int) -> Iterator[list[Any]]:
+        # An unbuffered cursor streams rows from the server as they are
+        # fetched, so only one chunk of rows is ever held in memory. The
+        # stream keeps its connection until it is exhausted or closed: other
+        # queries made while iterating need a second pooled connection, and
+        # inside a unit of work, which has only one, they raise PoolError.
+        timer.pause()
+        with timer, self._pool.connection(read_only=True) as connection:
+            timer.mark('pool_wait')
+            with self._pool.streaming(connection), connection.cursor(SSCursor) as cursor:
+                cursor.execute(query, params)
+                timer.mark('execute')
+                mapper = row_mapper(entity_type, tuple(column[0] for column in cursor.description))
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    timer.mark('fetch')
+                    if not rows:
+                        break
+                    timer.count(len(rows))
+                    chunk = list(map(mapper, rows))
+                    timer.mark('mapping')
+                    yield chunk
+                    timer.pause()
+
+    def _stream(self, chunks: Iterator[list[Any]], chunked: bool) -> Iterator[Any]:
+        if chunked:
+            yield from chunks
+        else:
+            for chunk in chunks:
+                yield from chunk
+
+    @classmethod
+    def _page_query(cls,
+                    query: str,
+                    filters: Filter,
+                    sort_column: str,
+                    key_column: str,
+                    page_size: int,
+                    token: str,
+                    direction: str) -> tuple[str, tuple]:
+        if page_size < 1:
+            raise ValueError('page_size must be at least 1')
+        if direction not in (FORWARD, BACKWARD):
+            raise ValueError(f'direction must be {FORWARD!r} or {BACKWARD!r}')
+
+        forward = direction == FORWARD
+        sort = cls._filters.column(sort_column)
+        key = cls._filters.column(key_column)
+        query += filters.where
+        params = list(filters.params)
+
+        if token is not None:
+            sort_value, key_value = decode_token(token)
+            operator = '>' if forward else '<'
+            query += ' AND ' if filters.where else ' WHERE '
+            query += f'({sort} {operator} %s OR ({sort} = %s AND {key} {operator} %s))'
+            params += [sort_value, sort_value, key_value]
+
+        # One extra row tells whether another page exists in this direction.
+        order = 'ASC' if forward else 'DESC'
+        query += f' ORDER BY {sort} {order}, {key} {order} LIMIT %s'
+        params.append(page_size + 1)
+        return query, tuple(params)
+
+    def _page(self,
+              query: str,
+              filters: Filter,
+              entity_type: type,
+              sort_column: str,
+              key_column: str,
+              page_size: int,
+              token: str,
+              direction: str) -> Page:
+        query, params = self._page_query(query, filters, sort_column, key_column, page_size, token, direction)
+        forward = direction == FORWARD
+
+        items = self._fetch_all(query, params, entity_type)
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        if not forward:
+            items.reverse()
+
+        if len(items) == 0:
+            return Page()
+
+        first = encode_token(getattr(items[0], sort_column), getattr(items[0], key_column))
+        last = encode_token(getattr(items[-1], sort_column), getattr(items[-1], key_column))
+        if forward:
+            return Page(items=items,
+                        next_token=last if has_more else None,
+                        previous_token=first if token is not None else None)
+        return Page(items=items,
+                    next_token=last if token is not None else None,
+                    previous_token=first if has_more else None)
+
+    @classmethod
+    def _changes_query(cls,
+                       query: str,
+                       filters: Filter,
+                       key_column: str,
+                       watermark: str,
+                       limit: int,
+                       lag: float,
+                       backend: Any) -> tuple[str, tuple]:
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+        if lag < 0:
+            raise ValueError('lag must not be negative')
+
+        sort = cls._filters.column('updated_at')
+        key = cls._filters.column(key_column)
+        query += filters.where
+        params = list(filters.params)
+        conditions = []
+
+        # Rows are read in (updated_at, key) order, so resuming after the last
+        # one seen never skips or repeats a row with the same timestamp. The
+        # leading >= gives the index a range to start from, which the planner
+        # keeps using alongside the lag bound below.
+        if watermark is not None:
+            updated_at, key_value = decode_token(watermark)
+            conditions.append(f'{sort} >= %s AND ({sort} > %s OR {key} > %s)')
+            params += [updated_at, updated_at, key_value]
+
+        # A transaction that commits late can still write an updated_at
+        # older than rows already read. Leaving out the last lag seconds
+        # gives it time to commit before the watermark moves past it.
+        if lag:
+            conditions.append(f'{sort} < {backend.seconds_ago()}')
+            params.append(lag)
+
+        if conditions:
+            query += (' AND ' if filters.where else ' WHERE ') + ' AND '.join(conditions)
+        query += f' ORDER BY {sort} ASC, {key} ASC LIMIT %s'
+        params.append(limit + 1)
+        return query, tuple(params)
+
+    def _changes(self,
+                 query: str,
+                 filters: Filter,
+                 fetch: Callable[[str, tuple], list[Any]],
+                 key_column: str,
+                 watermark: str,
+                 limit: int,
+                 lag: float) -> ChangeBatch:
+        query, params = self._changes_query(query, filters, key_column, watermark, limit, lag, self._pool.backend)
+        items = fetch(query, params)
+        has_more = len(items) > limit
+        items = items[:limit]
+        if items:
+            watermark = encode_token(items[-1].updated_at, getattr(items[-1], key_column))
+        return ChangeBatch(items=items, watermark=watermark, has_more=has_more)
+
+    def _execute(self, query: str, params: tuple) -> tuple[int, Any]:
+        with self._timer(query) as timer:
+            with self._pool.connection() as connection:
+                timer.mark('pool_wait')
+                with connection.cursor() as cursor:
+                    cursor.execute(query, params)
+                    rows_affected = cursor.rowcount
+                    last_id = cursor.lastrowid
+                self._commit(connection)
+                timer.mark('execute')
+            timer.count(rows_affected)
+        return rows_affected, last_id
+
+    def _execute_statements(self, statements: Iterable[tuple[str, tuple]]) -> list[tuple[int, Any]]:
+        # All statements run on one connection and commit together, so a
+        # failing chunk rolls back the whole batch.
+        statements = list(statements)
+        results = []
+        with self._timer(statements[0][0] if statements else '') as timer:
+            with self._pool.connection() as connection:
+                timer.mark('pool_wait')
+                with self._transaction(connection), connection.cursor() as cursor:
+                    for query, params in statements:
+                        cursor.execute(query, params)
+                        results.append((cursor.rowcount, cursor.lastrowid))
+                timer.mark('execute')
+            timer.count(sum(rows for rows, _ in results))
+        return results
+
+    def _execute_many(self, query: str, params: list[tuple]) -> int:
+        with self._timer(query) as timer:
+            with self._pool.connection() as connection:
+                timer.mark('pool_wait')
+                with self._transaction(connection), connection.cursor() as cursor:
+                    rows = cursor.executemany(query, params)
+                timer.mark('execute')
+            timer.count(rows or 0)
+        return rows
 
-import pymysql
+    def close(self) -> None:
+        # Also called from __del__, possibly on an instance whose __init__
+        # failed before the pool was set up.
+        pool = getattr(self, '_pool', None)
+        if pool is not None and self._owns_pool:
+            pool.close()
 
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
 
-class ExpenseRepositoryImplementation(ExpenseRepository):
-    def __init__(self,
-                 host: str,
-                 user: str,
-                 password: str,
-                 db_name: str,
-                 db_port: int):
-        super().__init__(host=host, user=user, password=password, db_name=db_name, db_port=db_port)
-        self._connection: Connection = pymysql.connect(
-            host=self._host,
-            user=self._user,
-            password=self._password,
-            database=self._db_name,
-            port=self._db_port
-        )
 
-    def get(self, id) -> Expense:
-        query = '''
+class ExpenseRepositoryImplementation(_PooledRepository, ExpenseRepository):
+    _select_query = '''
         SELECT
             e.`expense_id` AS `expense_id`,
             e.`expense_name` AS `expense_name`,
             e.`expense_amount` AS `expense_amount`,
             e.`month_year` AS `month_year`,
+            e.`user_id` AS `user_id`,
             e.`exp_category_id` AS `exp_category_id`,
             ec.`category_name` AS `category_name`,
             e.`status` AS `status`,
@@ -43,26 +448,11 @@ class ExpenseRepositoryImplementation(ExpenseRepository):
         FROM `expenses` AS e
         JOIN `expense_categories` AS ec
         ON e.exp_category_id = ec.exp_category_id
-        WHERE e.`expense_id` = %s
         '''
-        params = (id,)
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            result = cursor.fetchone()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
-
-        if result is None:
-            return None
 
-        if len(result) == 0:
-            return None
-
-        expense = Expense(**dict(zip(column_names, result)))
-        return expense
-
-    def get_by(self, **kwargs) -> list[Expense]:
-        query = '''
+    # Used instead of _select_query when category names come from a
+    # CategoryCache, which saves the JOIN on every read.
+    _select_without_category_query = '''
         SELECT
             e.`expense_id` AS `expense_id`,
             e.`expense_name` AS `expense_name`,
@@ -70,64 +460,268 @@ class ExpenseRepositoryImplementation(ExpenseRepository):
             e.`month_year` AS `month_year`,
             e.`user_id` AS `user_id`,
             e.`exp_category_id` AS `exp_category_id`,
-            ec.`category_name` AS `category_name`,
             e.`status` AS `status`,
             e.`created_at` AS `created_at`,
             e.`updated_at` AS `updated_at`
         FROM `expenses` AS e
+        '''
+
+    # Projections keep the JOIN even without category_name, so they skip
+    # expenses whose category is gone exactly as full reads do.
+    _from_query = '''
+        FROM `expenses` AS e
         JOIN `expense_categories` AS ec
         ON e.exp_category_id = ec.exp_category_id
         '''
 
-        if kwargs:
-            query += ' WHERE ' + ' AND '.join([f'{key} = %s' for key in kwargs.keys()])
+    _get_condition = ' WHERE e.`expense_id` = %s'
+
+    _filters = FilterBuilder({
+        'expense_id': 'e.`expense_id`',
+        'expense_name': 'e.`expense_name`',
+        'expense_amount': 'e.`expense_amount`',
+        'month_year': 'e.`month_year`',
+        'user_id': 'e.`user_id`',
+        'exp_category_id': 'e.`exp_category_id`',
+        'category_name': 'ec.`category_name`',
+        'status': 'e.`status`',
+        'created_at': 'e.`created_at`',
+        'updated_at': 'e.`updated_at`'
+    })
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query, tuple(kwargs.values()))
-            result = cursor.fetchall()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
+    def __init__(self,
+                 host: str = None,
+                 user: str = None,
+                 password: str = None,
+                 db_name: str = None,
+                 db_port: int = None,
+                 pool: ConnectionPool | ReplicaRouter = None,
+                 instrumentation: Instrumentation = None,
+                 category_cache: CategoryCache = None,
+                 pool_size: int = 1):
+        super().__init__(host=host, user=user, password=password, db_name=db_name, db_port=db_port)
+        self._init_pool(pool, instrumentation, pool_size)
+        self._category_cache = category_cache
+
+    def _categories_from_cache(self) -> bool:
+        # Inside a unit of work the JOIN reads the transaction's own view of
+        # the categories, which the shared cache may not reflect.
+        return self._category_cache is not None and self._pool.bound_connection() is None
+
+    def _category_names(self, category_ids: set) -> dict[Any, str]:
+        names = {}
+        missing = []
+        for category_id in category_ids:
+            category = self._category_cache.get(category_id)
+            if category is None:
+                missing.append(category_id)
+            else:
+                names[category_id] = category.category_name
+
+        if missing:
+            query = f'''
+            SELECT
+                `exp_category_id`,
+                `category_name`,
+                `status`,
+                `created_at`,
+                `updated_at`
+            FROM `expense_categories`
+            WHERE `exp_category_id` IN ({', '.join(['%s'] * len(missing))})
+            '''
+            for category in self._fetch_all(query, tuple(missing), ExpenseCategory):
+                self._category_cache.put(category)
+                names[category.exp_category_id] = category.category_name
+
+        return names
+
+    def _fetch_with_cached_categories(self, query: str, params: tuple) -> list[Expense]:
+        with self._timer(query) as timer:
+            column_names, result = self._query(query, params, timer)
+            if not result:
+                return []
+
+            category_index = column_names.index('exp_category_id')
+            names = self._category_names({row[category_index] for row in result})
+            timer.pause()
+            mapper = row_mapper(Expense, (*column_names, 'category_name'))
+            expenses = [mapper((*row, names[row[category_index]]))
+                        for row in result if row[category_index] in names]
+            timer.mark('mapping')
+            return expenses
+
+    def get(self, id, fields: Sequence[str] = None) -> Expense:
+        if fields is not None:
+            expenses = self._project(Expense, fields, {'expense_id': id})
+            return expenses[0] if expenses else None
 
-        if result is None:
-            return None
+        params = (id,)
 
-        if len(result) == 0:
-            return None
+        # Both modes read the same columns; the cached one drops expenses
+        # whose category is gone, as the JOIN would.
+        if self._categories_from_cache():
+            query = self._select_without_category_query + self._get_condition
+            expenses = self._fetch_with_cached_categories(query, params)
+            return expenses[0] if expenses else None
 
-        expense = [Expense(**dict(zip(column_names, row))) for row in result]
+        query = self._select_query + self._get_condition
+        expense = self._fetch_one(query, params, Expense)
         return expense
 
-    def get_all(self) -> list[Expense]:
-        query = '''
-        SELECT
-            e.`expense_id` AS `expense_id`,
-            e.`expense_name` AS `expense_name`,
-            e.`expense_amount` AS `expense_amount`,
-            e.`month_year` AS `month_year`,
-            e.`exp_category_id` AS `exp_category_id`,
-            ec.`category_name` AS `category_name`,
-            e.`status` AS `status`,
-            e.`created_at` AS `created_at`,
-            e.`updated_at` AS `updated_at`,
-        FROM `expenses` AS e
-        JOIN `expense_categories` AS ec
-        ON e.exp_category_id = ec.exp_category_id
-        '''
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query)
-            result = cursor.fetchall()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
+    def get_by(self, fields: Sequence[str] = None, **kwargs) -> list[Expense]:
+        if fields is not None:
+            return self._project(Expense, fields, kwargs) or None
 
-        if result is None:
+        filters = self._filters.build(kwargs)
+
+        # Filtering or ordering on category_name still needs the JOIN.
+        if self._categories_from_cache() and not self._filters.references(kwargs, 'category_name'):
+            query = self._select_without_category_query + filters.sql
+            expense = self._fetch_with_cached_categories(query, filters.params)
+        else:
+            query = self._select_query + filters.sql
+            expense = self._fetch_all(query, filters.params, Expense)
+
+        if len(expense) == 0:
             return None
 
-        if len(result) == 0:
+        return expense
+
+    def get_all(self, fields: Sequence[str] = None) -> list[Expense]:
+        if fields is not None:
+            return self._project(Expense, fields, {}) or None
+
+        if self._categories_from_cache():
+            expenses = self._fetch_with_cached_categories(self._select_without_category_query, ())
+        else:
+            expenses = self._fetch_all(self._select_query, (), Expense)
+
+        if len(expenses) == 0:
             return None
 
-        expenses = [Expense(**dict(zip(column_names, row))) for row in result]
         return expenses
 
+    def get_many(self, ids: Iterable[Any], chunk_size: int = 1000) -> dict[Any, Expense]:
+        if self._categories_from_cache():
+            return self._get_many(self._select_without_category_query, 'e.`expense_id`', 'expense_id',
+                                  ids, self._fetch_with_cached_categories, chunk_size)
+        return self._get_many(self._select_query, 'e.`expense_id`', 'expense_id',
+                              ids, lambda query, params: self._fetch_all(query, params, Expense), chunk_size)
+
+    def iter_by(self, chunk_size: int = 1000, chunked: bool = False, **kwargs) -> Iterator[Expense]:
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
+
+        chunks = self._iterate(query, filters.params, Expense, chunk_size)
+        return self._stream(chunks, chunked)
+
+    def iter_all(self, chunk_size: int = 1000, chunked: bool = False) -> Iterator[Expense]:
+        chunks = self._iterate(self._select_query, (), Expense, chunk_size)
+        return self._stream(chunks, chunked)
+
+    def page_by(self,
+                page_size: int = 50,
+                token: str = None,
+                direction: str = FORWARD,
+                **kwargs) -> Page:
+        return self._page(self._select_query, self._filters.build(kwargs, ordering=False), Expense,
+                          'created_at', 'expense_id', page_size, token, direction)
+
+    def changes_since(self,
+                      watermark: str = None,
+                      limit: int = 1000,
+                      lag: float = 5.0,
+                      **kwargs) -> ChangeBatch:
+        # Always the JOIN: with cached categories the orphans would only be
+        # dropped after LIMIT, and a batch made of orphans could never move
+        # the watermark past them.
+        return self._changes(self._select_query, self._filters.build(kwargs, ordering=False),
+                             lambda query, params: self._fetch_all(query, params, Expense),
+                             'expense_id', watermark, limit, lag)
+
+    def export(self, destination: Any, format: str = 'csv', chunk_size: int = 10000, **kwargs) -> int:
+        # Reads in primary-key order, one keyset chunk at a time, and hands
+        # the raw rows to the writer, so memory stays at one chunk however
+        # large the table is. Returns the number of rows written.
+        if chunk_size < 1:
+            raise ValueError('chunk size must be at least 1')
+        if format not in FORMATS:
+            raise ValueError(f'format must be one of {FORMATS}')
+
+        filters = self._filters.build(kwargs, ordering=False)
+        key = self._filters.column('expense_id')
+        query = self._select_query + filters.where + (' AND ' if filters.where else ' WHERE ') + f'{key} > %s'
+        query += f' ORDER BY {key} LIMIT %s'
+
+        writer = None
+        written = 0
+        last_id = 0
+        try:
+            while True:
+                column_names, rows = self._fetch_rows(query, (*filters.params, last_id, chunk_size))
+                if writer is None:
+                    writer = open_writer(destination, format, column_names, EXPENSE_ARROW_TYPES)
+                if not rows:
+                    break
+                writer.write(rows)
+                written += len(rows)
+                last_id = rows[-1][column_names.index('expense_id')]
+                if len(rows) < chunk_size:
+                    break
+        finally:
+            if writer is not None:
+                writer.close()
+        return written
+
+    @staticmethod
+    def _totals_query(group_by: tuple[str, ...],
+                      user_id: Any,
+                      month_from: Any,
+                      month_to: Any) -> tuple[str, tuple]:
+        unknown = set(group_by) - set(GROUP_BY_COLUMNS)
+        if unknown:
+            raise ValueError(f'Cannot group expenses by {sorted(unknown)}; expected any of {GROUP_BY_COLUMNS}')
+
+        dimensions = [f'e.`{column}`' if column in group_by else 'NULL' for column in GROUP_BY_COLUMNS]
+        query = f'''
+        SELECT
+            {dimensions[0]} AS `month_year`,
+            {dimensions[1]} AS `exp_category_id`,
+            SUM(e.`expense_amount`) AS `total`,
+            COUNT(*) AS `count`,
+            AVG(e.`expense_amount`) AS `average`
+        FROM `expenses` AS e
+        '''
+
+        conditions = []
+        params = []
+        if user_id is not None:
+            conditions.append('e.`user_id` = %s')
+            params.append(user_id)
+        if month_from is not None:
+            conditions.append('e.`month_year` >= %s')
+            params.append(month_from)
+        if month_to is not None:
+            conditions.append('e.`month_year` <= %s')
+            params.append(month_to)
+
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+
+        if group_by:
+            columns = ', '.join([f'e.`{column}`' for column in group_by])
+            query += f' GROUP BY {columns} ORDER BY {columns}'
+        return query, tuple(params)
+
+    def totals(self,
+               group_by: Iterable[str] = ('month_year',),
+               user_id: Any = None,
+               month_from: Any = None,
+               month_to: Any = None) -> list[ExpenseTotal]:
+        query, params = self._totals_query(tuple(group_by), user_id, month_from, month_to)
+        _, result = self._fetch_rows(query, params)
+        return [ExpenseTotal(*row) for row in result if row[3]]
+
     def add(self, entity: Expense) -> Any:
         query = '''
         INSERT INTO `expenses`
@@ -138,12 +732,37 @@ class ExpenseRepositoryImplementation(ExpenseRepository):
         params = (entity.expense_name, entity.expense_amount,
                   entity.month_year, entity.exp_category_id, entity.user_id)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            id = cursor.lastrowid
-        self._connection.commit()
+        _, id = self._execute(query, params)
         return id
 
+    @staticmethod
+    def _add_batch_statements(entities: list[Expense],
+                              chunk_size: int) -> tuple[list[list[Expense]], list[tuple[str, tuple]]]:
+        chunks = list(_chunks(entities, chunk_size))
+        statements = []
+        for chunk in chunks:
+            query = '''
+            INSERT INTO `expenses`
+                (`expense_name`, `expense_amount`, `month_year`, `exp_category_id`, `user_id`)
+            VALUES
+            ''' + ', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))
+            params = tuple(value for entity in chunk for value in (
+                entity.expense_name, entity.expense_amount,
+                entity.month_year, entity.exp_category_id, entity.user_id))
+            statements.append((query, params))
+        return chunks, statements
+
+    def add_batch(self, entities: list[Expense], chunk_size: int = 1000) -> list[Any]:
+        chunks, statements = self._add_batch_statements(entities, chunk_size)
+
+        # InnoDB hands a multi-row INSERT a consecutive block of
+        # auto-increment ids starting at lastrowid (auto_increment_increment
+        # is assumed to be 1).
+        ids = []
+        for chunk, (_, first_id) in zip(chunks, self._execute_statements(statements)):
+            ids.extend(range(first_id, first_id + len(chunk)))
+        return ids
+
     def update(self, id, entity: Expense) -> bool:
         query = '''
         UPDATE `expenses`
@@ -154,46 +773,56 @@ class ExpenseRepositoryImplementation(ExpenseRepository):
         WHERE `expense_id` = %s
         '''
         params = (entity.expense_name, entity.expense_amount, entity.month_year, entity.exp_category_id, id)
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            rows_affected = cursor.rowcount
-        self._connection.commit()
+        rows_affected, _ = self._execute(query, params)
         return rows_affected > 0
 
+    def update_batch(self, entities: dict[Any, Expense], chunk_size: int = 1000) -> int:
+        columns = ['expense_name', 'expense_amount', 'month_year', 'exp_category_id']
+        statements = []
+        for chunk in _chunks(list(entities.items()), chunk_size):
+            case = 'CASE `expense_id` ' + ' '.join(['WHEN %s THEN %s'] * len(chunk)) + ' END'
+            query = '''
+            UPDATE `expenses`
+            SET ''' + ',\n                '.join([f'`{column}` = {case}' for column in columns]) + f'''
+            WHERE `expense_id` IN ({', '.join(['%s'] * len(chunk))})
+            '''
+            params = []
+            for column in columns:
+                for id, entity in chunk:
+                    params += [id, getattr(entity, column)]
+            params += [id for id, _ in chunk]
+            statements.append((query, tuple(params)))
+
+        return sum(rows for rows, _ in self._execute_statements(statements))
+
+    def upsert_batch(self, entities: list[Expense], chunk_size: int = 1000) -> int:
+        statements = []
+        for chunk in _chunks(entities, chunk_size):
+            query = '''
+            INSERT INTO `expenses`
+                (`expense_id`, `expense_name`, `expense_amount`, `month_year`, `exp_category_id`, `user_id`)
+            VALUES
+            ''' + ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(chunk)) + self._pool.backend.upsert_clause(
+                'expense_id', ['expense_name', 'expense_amount', 'month_year', 'exp_category_id'])
+            params = tuple(value for entity in chunk for value in (
+                entity.expense_id, entity.expense_name, entity.expense_amount,
+                entity.month_year, entity.exp_category_id, entity.user_id))
+            statements.append((query, params))
+
+        return sum(rows for rows, _ in self._execute_statements(statements))
+
     def delete(self, id) -> bool:
         query = '''
         DELETE FROM `expenses`
         WHERE `expense_id` = %s
         '''
         params = (id,)
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            rows_affected = cursor.rowcount
-        self._connection.commit()
+        rows_affected, _ = self._execute(query, params)
         return rows_affected > 0
 
-    def __del__(self):
-        self._connection.close()
-
-
-class ExpenseCategoriesRepositoryImplementation(ExpenseCategoriesRepository):
-    def __init__(self,
-                 host: str,
-                 user: str,
-                 password: str,
-                 db_name: str,
-                 db_port: int):
-        super().__init__(host=host, user=user, password=password, db_name=db_name, db_port=db_port)
-        self._connection: Connection = pymysql.connect(
-            host=self._host,
-            user=self._user,
-            password=self._password,
-            database=self._db_name,
-            port=self._db_port
-        )
 
-    def get(self, id) -> ExpenseCategory:
-        query = '''
+class ExpenseCategoriesRepositoryImplementation(_PooledRepository, ExpenseCategoriesRepository):
+    _select_query = '''
         SELECT
             `exp_category_id`,
             `category_name`,
@@ -201,146 +830,179 @@ class ExpenseCategoriesRepositoryImplementation(ExpenseCategoriesRepository):
             `created_at`,
             `updated_at`
         FROM `expense_categories`
-        WHERE `exp_category_id` = %s
         '''
-        params = (id,)
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            result = cursor.fetchone()
-            column_names = [column[0] for column in cursor.description]
 
-        if result is None:
-            return None
+    _from_query = 'FROM `expense_categories`'
 
-        if len(result) is None:
-            return None
-
-        category = ExpenseCategory(**dict(zip(column_names, result)))
-        self._connection.commit()
+    _get_condition = ' WHERE `exp_category_id` = %s'
 
-        return category
-
-    def get_by(self, **kwargs) -> list[ExpenseCategory]:
-        query = '''
-        SELECT
-            `exp_category_id`,
-            `category_name`,
-            `status`,
-            `created_at`,
-            `updated_at`
-        FROM `expense_categories`
-        '''
+    _filters = FilterBuilder({
+        'exp_category_id': '`exp_category_id`',
+        'category_name': '`category_name`',
+        'status': '`status`',
+        'created_at': '`created_at`',
+        'updated_at': '`updated_at`'
+    })
 
-        if kwargs:
-            query += ' WHERE ' + ' AND '.join([f'{key} = %s' for key in kwargs.keys()])
+    def __init__(self,
+                 host: str = None,
+                 user: str = None,
+                 password: str = None,
+                 db_name: str = None,
+                 db_port: int = None,
+                 pool: ConnectionPool | ReplicaRouter = None,
+                 instrumentation: Instrumentation = None,
+                 cache: CategoryCache = None,
+                 pool_size: int = 1):
+        super().__init__(host=host, user=user, password=password, db_name=db_name, db_port=db_port)
+        self._init_pool(pool, instrumentation, pool_size)
+        self._cache = cache
+
+    def _shared_cache(self) -> CategoryCache:
+        # Reads inside a unit of work may see uncommitted rows, which must not
+        # reach the cache other sessions read, and the cache may not reflect
+        # the transaction's own writes; both bypass it.
+        return self._cache if self._pool.bound_connection() is None else None
+
+    def _invalidate_cached(self, id) -> None:
+        # Inside a unit of work the entry is dropped again after the commit,
+        # in case another session reloaded the old row in between.
+        if self._cache is None:
+            return
+        self._cache.invalidate(id)
+        bound = self._pool.bound_connection()
+        if bound is not None:
+            after_commit(bound, lambda: self._cache.invalidate(id))
+
+    def get(self, id, fields: Sequence[str] = None) -> ExpenseCategory:
+        if fields is not None:
+            categories = self._project(ExpenseCategory, fields, {'exp_category_id': id})
+            return categories[0] if categories else None
+
+        cache = self._shared_cache()
+        if cache is not None:
+            category = cache.get(id)
+            if category is not None:
+                return category
+
+        query = self._select_query + self._get_condition
+        params = (id,)
+        category = self._fetch_one(query, params, ExpenseCategory)
+        if category is not None and cache is not None:
+            cache.put(category)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query, tuple(kwargs.values()))
-            result = cursor.fetchall()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
+        return category
 
-        if result is None:
-            return None
+    def get_by(self, fields: Sequence[str] = None, **kwargs) -> list[ExpenseCategory]:
+        if fields is not None:
+            return self._project(ExpenseCategory, fields, kwargs)
 
-        if len(result) is None:
-            return None
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
 
-        categories = [ExpenseCategory(**dict(zip(column_names, row))) for row in result]
+        categories = self._fetch_all(query, filters.params, ExpenseCategory)
 
         return categories
 
-    def get_all(self) -> list[ExpenseCategory]:
-        with self._connection.cursor() as cursor:
-            cursor.execute(
-                '''
-                SELECT
-                    `exp_category_id`,
-                    `category_name`,
-                    `status`,
-                    `created_at`,
-                    `updated_at`
-                FROM `expense_categories`
-                '''
-            )
-            result = cursor.fetchall()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
-
-        if result is None:
-            return None
-
-        if len(result) is None:
-            return None
-
-        categories = [ExpenseCategory(**dict(zip(column_names, row))) for row in result]
+    def get_all(self, fields: Sequence[str] = None) -> list[ExpenseCategory]:
+        if fields is not None:
+            return self._project(ExpenseCategory, fields, {})
+
+        cache = self._shared_cache()
+        if cache is not None:
+            categories = cache.get_all()
+            if categories is not None:
+                return categories
+
+        categories = self._fetch_all(
+            '''
+            SELECT
+                `exp_category_id`,
+                `category_name`,
+                `status`,
+                `created_at`,
+                `updated_at`
+            FROM `expense_categories`
+            ''',
+            (),
+            ExpenseCategory
+        )
+        if cache is not None:
+            cache.put_all(categories)
 
         return categories
 
+    def get_many(self, ids: Iterable[Any], chunk_size: int = 1000) -> dict[Any, ExpenseCategory]:
+        ids = list(dict.fromkeys(ids))
+        found = {}
+        cache = self._shared_cache()
+        if cache is not None:
+            for id in ids:
+                category = cache.get(id)
+                if category is not None:
+                    found[id] = category
+            ids = [id for id in ids if id not in found]
+
+        fetched = self._get_many(self._select_query, '`exp_category_id`', 'exp_category_id', ids,
+                                 lambda query, params: self._fetch_all(query, params, ExpenseCategory),
+                                 chunk_size)
+        if cache is not None:
+            for category in fetched.values():
+                cache.put(category)
+
+        found.update(fetched)
+        return found
+
+    def iter_by(self, chunk_size: int = 1000, chunked: bool = False, **kwargs) -> Iterator[ExpenseCategory]:
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
+
+        chunks = self._iterate(query, filters.params, ExpenseCategory, chunk_size)
+        return self._stream(chunks, chunked)
+
+    def iter_all(self, chunk_size: int = 1000, chunked: bool = False) -> Iterator[ExpenseCategory]:
+        chunks = self._iterate(self._select_query, (), ExpenseCategory, chunk_size)
+        return self._stream(chunks, chunked)
+
     def add(self, entity: ExpenseCategory) -> Any:
-        with self._connection.cursor() as cursor:
-            cursor.execute(
-                '''
-                INSERT INTO `expense_categories`
-                    (`exp_category_id`, `exp_category_name`)
-                VALUES
-                    (%s, %s)
-                ''',
-                (entity.exp_category_id, entity.category_name)
-            )
-            id = cursor.lastrowid
-        self._connection.commit()
+        _, id = self._execute(
+            '''
+            INSERT INTO `expense_categories`
+                (`exp_category_id`, `category_name`)
+            VALUES
+                (%s, %s)
+            ''',
+            (entity.exp_category_id, entity.category_name)
+        )
+        self._invalidate_cached(id)
         return id
 
     def update(self, id, entity: ExpenseCategory) -> bool:
-        with self._connection.cursor() as cursor:
-            cursor.execute(
-                '''
-                UPDATE `expense_categories`
-                SET `exp_category_name` = %s
-                WHERE `exp_category_id` = %s
-                ''',
-                (entity.category_name, id)
-            )
-            rows_affected = cursor.rowcount
-        self._connection.commit()
+        rows_affected, _ = self._execute(
+            '''
+            UPDATE `expense_categories`
+            SET `category_name` = %s
+            WHERE `exp_category_id` = %s
+            ''',
+            (entity.category_name, id)
+        )
+        self._invalidate_cached(id)
         return rows_affected > 0
 
     def delete(self, id) -> bool:
-        with self._connection.cursor() as cursor:
-            cursor.execute(
-                '''
-                DELETE FROM `expense_categories`
-                WHERE `exp_category_id` = %s
-                ''',
-                (id,)
-            )
-            rows_affected = cursor.rowcount
-        self._connection.commit()
+        rows_affected, _ = self._execute(
+            '''
+            DELETE FROM `expense_categories`
+            WHERE `exp_category_id` = %s
+            ''',
+            (id,)
+        )
+        self._invalidate_cached(id)
         return rows_affected > 0
 
-    def __del__(self):
-        self._connection.close()
-
 
-class UserRepositoryImplementation(UserRepository):
-    def __init__(self,
-                 host: str,
-                 user: str,
-                 password: str,
-                 db_name: str,
-                 db_port: int):
-        super().__init__(host=host, user=user, password=password, db_name=db_name, db_port=db_port)
-        self._connection: Connection = pymysql.connect(
-            host=self._host,
-            user=self._user,
-            password=self._password,
-            database=self._db_name,
-            port=self._db_port
-        )
-
-    def get(self, id) -> User:
-        query = '''
+class UserRepositoryImplementation(_PooledRepository, UserRepository):
+    _select_query = '''
         SELECT
             `user_id`,
             `username`,
@@ -349,56 +1011,62 @@ class UserRepositoryImplementation(UserRepository):
             `created_at`,
             `updated_at`
         FROM `users`
-        WHERE `user_id` = %s
         '''
-        params = (id,)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            result = cursor.fetchone()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
+    _from_query = 'FROM `users`'
 
-        if result is None:
-            return None
+    _get_condition = ' WHERE `user_id` = %s'
 
-        if len(result) == 0:
-            return None
+    _filters = FilterBuilder({
+        'user_id': '`user_id`',
+        'username': '`username`',
+        'password': '`password`',
+        'status': '`status`',
+        'created_at': '`created_at`',
+        'updated_at': '`updated_at`'
+    })
 
-        user = User(**dict(zip(column_names, result)))
-        return user
+    def __init__(self,
+                 host: str = None,
+                 user: str = None,
+                 password: str = None,
+                 db_name: str = None,
+                 db_port: int = None,
+                 pool: ConnectionPool | ReplicaRouter = None,
+                 instrumentation: Instrumentation = None,
+                 pool_size: int = 1):
+        super().__init__(host=host, user=user, password=password, db_name=db_name, db_port=db_port)
+        self._init_pool(pool, instrumentation, pool_size)
 
-    def get_by(self, **kwargs) -> list[User]:
-        query = '''
-        SELECT
-            `user_id`,
-            `username`,
-            `password`,
-            `status`,
-            `created_at`,
-            `updated_at`
-        FROM `users`
-        '''
+    def get(self, id, fields: Sequence[str] = None) -> User:
+        if fields is not None:
+            users = self._project(User, fields, {'user_id': id})
+            return users[0] if users else None
+
+        query = self._select_query + self._get_condition
+        params = (id,)
 
-        if kwargs:
-            query += ' WHERE ' + ' AND '.join([f'{key} = %s' for key in kwargs.keys()])
+        user = self._fetch_one(query, params, User)
+        return user
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query, tuple(kwargs.values()))
-            result = cursor.fetchall()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
+    def get_by(self, fields: Sequence[str] = None, **kwargs) -> list[User]:
+        if fields is not None:
+            return self._project(User, fields, kwargs) or None
 
-        if result is None:
-            return None
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
 
-        if len(result) == 0:
+        user = self._fetch_all(query, filters.params, User)
+
+        if len(user) == 0:
             return None
 
-        user = [User(**dict(zip(column_names, row))) for row in result]
         return user
 
-    def get_all(self) -> list[User]:
+    def get_all(self, fields: Sequence[str] = None) -> list[User]:
+        if fields is not None:
+            return self._project(User, fields, {}) or None
+
         query = '''
         SELECT
             `user_id`,
@@ -409,21 +1077,28 @@ class UserRepositoryImplementation(UserRepository):
             `updated_at`
         FROM `users`
         '''
-        with self._connection.cursor() as cursor:
-            cursor.execute(query)
-            result = cursor.fetchall()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
+        users = self._fetch_all(query, (), User)
 
-        if result is None:
+        if len(users) == 0:
             return None
 
-        if len(result) == 0:
-            return None
-
-        users = [User(**dict(zip(column_names, row))) for row in result]
         return users
 
+    def get_many(self, ids: Iterable[Any], chunk_size: int = 1000) -> dict[Any, User]:
+        return self._get_many(self._select_query, '`user_id`', 'user_id',
+                              ids, lambda query, params: self._fetch_all(query, params, User), chunk_size)
+
+    def iter_by(self, chunk_size: int = 1000, chunked: bool = False, **kwargs) -> Iterator[User]:
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
+
+        chunks = self._iterate(query, filters.params, User, chunk_size)
+        return self._stream(chunks, chunked)
+
+    def iter_all(self, chunk_size: int = 1000, chunked: bool = False) -> Iterator[User]:
+        chunks = self._iterate(self._select_query, (), User, chunk_size)
+        return self._stream(chunks, chunked)
+
     def add(self, entity: User) -> Any:
         query = '''
         INSERT INTO `users`
@@ -433,10 +1108,7 @@ class UserRepositoryImplementation(UserRepository):
         '''
         params = (entity.username, entity.password)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            id = cursor.lastrowid
-        self._connection.commit()
+        _, id = self._execute(query, params)
         return id
 
     def update(self, id, entity: User) -> bool:
@@ -449,10 +1121,7 @@ class UserRepositoryImplementation(UserRepository):
 
         params = (entity.username, entity.password, id)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            rows_affected = cursor.rowcount()
-        self._connection.commit()
+        rows_affected, _ = self._execute(query, params)
         return rows_affected > 0
 
     def delete(self, id) -> bool:
@@ -462,31 +1131,12 @@ class UserRepositoryImplementation(UserRepository):
         '''
         params = (id,)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            rows_affected = cursor.rowcount()
-        self._connection.commit()
+        rows_affected, _ = self._execute(query, params)
         return rows_affected > 0
 
 
-class ChatHistoryRepositoryImplementation(ChatHistoryRepository):
-    def __init__(self,
-                 host: str,
-                 user: str,
-                 password: str,
-                 db_name: str,
-                 db_port: int):
-        super().__init__(host=host, user=user, password=password, db_name=db_name, db_port=db_port)
-        self._connection: Connection = pymysql.connect(
-            host=self._host,
-            user=self._user,
-            password=self._password,
-            database=self._db_name,
-            port=self._db_port
-        )
-
-    def get(self, id) -> ChatHistory:
-        query = '''
+class ChatHistoryRepositoryImplementation(_PooledRepository, ChatHistoryRepository):
+    _select_query = '''
         SELECT
             `chat_id`,
             `user_id`,
@@ -496,57 +1146,72 @@ class ChatHistoryRepositoryImplementation(ChatHistoryRepository):
             `created_at`,
             `updated_at`
         FROM `chats`
-        WHERE `history_id` = %s
         '''
-        params = (id,)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            result = cursor.fetchone()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
+    _from_query = 'FROM `chats`'
 
-        if result is None:
-            return None
+    _get_condition = ' WHERE `chat_id` = %s'
 
-        if len(result) == 0:
-            return None
+    # Newest first; callers reverse the rows into chronological order.
+    _recent_query = _select_query + '''
+        WHERE `user_id` = %s
+        ORDER BY `created_at` DESC, `chat_id` DESC
+        LIMIT %s
+        '''
 
-        chat = ChatHistory(**dict(zip(column_names, result)))
-        return chat
+    _filters = FilterBuilder({
+        'chat_id': '`chat_id`',
+        'user_id': '`user_id`',
+        'content': '`content`',
+        'role_id': '`role_id`',
+        'status': '`status`',
+        'created_at': '`created_at`',
+        'updated_at': '`updated_at`'
+    })
 
-    def get_by(self, **kwargs) -> list[ChatHistory]:
-        query = '''
-        SELECT
-            `chat_id`,
-            `user_id`,
-            `content`,
-            `role_id`,
-            `status`,
-            `created_at`,
-            `updated_at`
-        FROM `chats`
-        '''
+    def __init__(self,
+                 host: str = None,
+                 user: str = None,
+                 password: str = None,
+                 db_name: str = None,
+                 db_port: int = None,
+                 pool: ConnectionPool | ReplicaRouter = None,
+                 instrumentation: Instrumentation = None,
+                 tail_cache: ChatTailCache = None,
+                 pool_size: int = 1):
+        super().__init__(host=host, user=user, password=password, db_name=db_name, db_port=db_port)
+        self._init_pool(pool, instrumentation, pool_size)
+        self._tail_cache = tail_cache
+
+    def get(self, id, fields: Sequence[str] = None) -> ChatHistory:
+        if fields is not None:
+            chats = self._project(ChatHistory, fields, {'chat_id': id})
+            return chats[0] if chats else None
 
-        if kwargs:
-            query += ' WHERE ' + ' AND '.join([f'{key} = %s' for key in kwargs.keys()])
+        query = self._select_query + self._get_condition
+        params = (id,)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=tuple(kwargs.values()))
-            result = cursor.fetchall()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
+        chat = self._fetch_one(query, params, ChatHistory)
+        return chat
 
-        if result is None:
-            return None
+    def get_by(self, fields: Sequence[str] = None, **kwargs) -> list[ChatHistory]:
+        if fields is not None:
+            return self._project(ChatHistory, fields, kwargs) or None
 
-        if len(result) == 0:
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
+
+        chat = self._fetch_all(query, filters.params, ChatHistory)
+
+        if len(chat) == 0:
             return None
 
-        chat = [ChatHistory(**dict(zip(column_names, row))) for row in result]
         return chat
 
-    def get_all(self) -> list[ChatHistory]:
+    def get_all(self, fields: Sequence[str] = None) -> list[ChatHistory]:
+        if fields is not None:
+            return self._project(ChatHistory, fields, {}) or None
+
         query = '''
         SELECT
             `chat_id`,
@@ -558,21 +1223,135 @@ class ChatHistoryRepositoryImplementation(ChatHistoryRepository):
             `updated_at`
         FROM `chats`
         '''
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query)
-            result = cursor.fetchall()
-            column_names = [column[0] for column in cursor.description]
-        self._connection.commit()
+        chats = self._fetch_all(query, (), ChatHistory)
 
-        if result is None:
+        if len(chats) == 0:
             return None
 
-        if len(result) == 0:
-            return None
+        return chats
 
-        chats = [ChatHistory(**dict(zip(column_names, row))) for row in result]
+    def get_many(self, ids: Iterable[Any], chunk_size: int = 1000) -> dict[Any, ChatHistory]:
+        return self._get_many(self._select_query, '`chat_id`', 'chat_id',
+                              ids, lambda query, params: self._fetch_all(query, params, ChatHistory), chunk_size)
+
+    def iter_by(self, chunk_size: int = 1000, chunked: bool = False, **kwargs) -> Iterator[ChatHistory]:
+        filters = self._filters.build(kwargs)
+        query = self._select_query + filters.sql
+
+        chunks = self._iterate(query, filters.params, ChatHistory, chunk_size)
+        return self._stream(chunks, chunked)
+
+    def iter_all(self, chunk_size: int = 1000, chunked: bool = False) -> Iterator[ChatHistory]:
+        chunks = self._iterate(self._select_query, (), ChatHistory, chunk_size)
+        return self._stream(chunks, chunked)
+
+    def page_by(self,
+                page_size: int = 50,
+                token: str = None,
+                direction: str = FORWARD,
+                **kwargs) -> Page:
+        return self._page(self._select_query, self._filters.build(kwargs, ordering=False), ChatHistory,
+                          'created_at', 'chat_id', page_size, token, direction)
+
+    def changes_since(self,
+                      watermark: str = None,
+                      limit: int = 1000,
+                      lag: float = 5.0,
+                      **kwargs) -> ChangeBatch:
+        return self._changes(self._select_query, self._filters.build(kwargs, ordering=False),
+                             lambda query, params: self._fetch_all(query, params, ChatHistory),
+                             'chat_id', watermark, limit, lag)
+
+    def _fetch_recent(self, user_id, limit: int) -> list[ChatHistory]:
+        chats = self._fetch_all(self._recent_query, (user_id, limit), ChatHistory)
+        chats.reverse()
         return chats
 
+    def _invalidate_tails(self, user_ids: Iterable[Any] = None) -> None:
+        # Drops the tails of user_ids, or every tail, so they are reloaded
+        # from the database on the next read. Inside a unit of work they are
+        # dropped again after the commit, in case another session reloaded
+        # them in between.
+        if self._tail_cache is None:
+            return
+
+        user_ids = None if user_ids is None else set(user_ids)
+
+        def invalidate() -> None:
+            if user_ids is None:
+                self._tail_cache.invalidate()
+                return
+            for user_id in user_ids:
+                self._tail_cache.invalidate(user_id)
+
+        invalidate()
+        bound = self._pool.bound_connection()
+        if bound is not None:
+            after_commit(bound, invalidate)
+
+    def _append_tail(self, user_id, chat_id) -> None:
+        # Keeps a cached tail warm across a conversation: the committed row
+        # is read back for its timestamps and appended. Inside a unit of work
+        # this waits for the commit, so a rollback leaves the tail alone.
+        if self._tail_cache is None:
+            return
+
+        def append() -> None:
+            chats = []
+            if user_id in self._tail_cache:
+                try:
+                    chat = self.get(chat_id)
+                except Exception:
+                    # The insert has committed; losing the tail only costs
+                    # a reload.
+                    self._tail_cache.invalidate(user_id)
+                    return
+                if chat is not None:
+                    chats.append(chat)
+            self._tail_cache.append(user_id, chats)
+
+        bound = self._pool.bound_connection()
+        if bound is None:
+            append()
+        else:
+            after_commit(bound, append)
+
+    def get_recent(self,
+                   user_id,
+                   limit: int = 20,
+                   budget: int = None,
+                   measure: Callable[[str], int] = len) -> list[ChatHistory]:
+        chats = None
+        # Inside a unit of work the reads see uncommitted rows, which must
+        # not end up in the shared tail cache.
+        if (self._tail_cache is not None and limit <= self._tail_cache.size
+                and self._pool.bound_connection() is None):
+            chats = self._tail_cache.get(user_id, limit)
+            if chats is None:
+                # A write committed while reading makes the rows stale, and
+                # the cache then refuses them.
+                generation = self._tail_cache.generation()
+                loaded = self._fetch_recent(user_id, self._tail_cache.size)
+                self._tail_cache.load(user_id, loaded, len(loaded) < self._tail_cache.size, generation)
+                chats = loaded[-limit:] if limit else []
+
+        if chats is None:
+            chats = self._fetch_recent(user_id, limit)
+
+        if budget is None:
+            return chats
+
+        # Keep the newest messages whose combined size (characters by
+        # default, or tokens with a tokenizer as measure) fits the budget.
+        used = 0
+        start = len(chats)
+        while start > 0:
+            used += measure(chats[start - 1].content or '')
+            if used > budget:
+                break
+            start -= 1
+        return chats[start:]
+
     def add(self, entity: ChatHistory) -> Any:
         query = '''
         INSERT INTO `chats`
@@ -582,10 +1361,8 @@ class ChatHistoryRepositoryImplementation(ChatHistoryRepository):
         '''
         params = (entity.user_id, entity.role_id, entity.content)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            id = cursor.lastrowid
-        self._connection.commit()
+        _, id = self._execute(query, params)
+        self._append_tail(entity.user_id, id)
         return id
 
     def add_batch(self, entities: list[ChatHistory]) -> Any:
@@ -597,9 +1374,10 @@ class ChatHistoryRepositoryImplementation(ChatHistoryRepository):
         '''
         params = [(entity.user_id, entity.role_id, entity.content) for entity in entities]
 
-        with self._connection.cursor() as cursor:
-            rows = cursor.executemany(query=query, args=params)
-        self._connection.commit()
+        rows = self._execute_many(query, params)
+        # executemany reports no ids to read the rows back by, so these
+        # tails are reloaded instead.
+        self._invalidate_tails(entity.user_id for entity in entities)
         if rows is None:
             return None
         if rows == 0:
@@ -617,10 +1395,8 @@ class ChatHistoryRepositoryImplementation(ChatHistoryRepository):
         '''
         params = (entity.user_id, entity.role_id, entity.content, id)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            rows_affected = cursor.rowcount
-        self._connection.commit()
+        rows_affected, _ = self._execute(query, params)
+        self._invalidate_tails()
         return rows_affected > 0
 
     def delete(self, id) -> bool:
@@ -630,26 +1406,83 @@ class ChatHistoryRepositoryImplementation(ChatHistoryRepository):
         '''
         params = (id,)
 
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query, args=params)
-            rows_affected = cursor.rowcount
-        self._connection.commit()
+        rows_affected, _ = self._execute(query, params)
+        self._invalidate_tails()
         return rows_affected > 0
 
-    def delete_batch(self, chat_ids: list[Any]) -> bool:
-        query = '''
-        DELETE FROM `chats`
-        WHERE `chat_id` = %s
+    def delete_batch(self, chat_ids: list[Any], chunk_size: int = 1000) -> bool:
+        statements = []
+        for chunk in _chunks(list(dict.fromkeys(chat_ids)), chunk_size):
+            query = f'''
+            DELETE FROM `chats`
+            WHERE `chat_id` IN ({', '.join(['%s'] * len(chunk))})
+            '''
+            statements.append((query, tuple(chunk)))
+
+        rows = sum(rows for rows, _ in self._execute_statements(statements))
+        self._invalidate_tails()
+        return rows > 0
+
+    def purge_older_than(self,
+                         cutoff: Any,
+                         user_id: Any = None,
+                         batch_size: int = 500,
+                         pause: float = 0.1,
+                         archive: Callable[[list[ChatHistory]], None] = None) -> int:
+        # Every batch commits on its own so the purge never holds locks or
+        # undo history for longer than one small DELETE.
+        if self._pool.bound_connection() is not None:
+            raise RuntimeError('purge_older_than commits per batch and cannot run inside a unit of work')
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+
+        conditions = ['`created_at` < %s']
+        params = [cutoff]
+        if user_id is not None:
+            conditions.append('`user_id` = %s')
+            params.append(user_id)
+        where = f'''
+        WHERE {' AND '.join(conditions)}
+        ORDER BY `chat_id`
+        LIMIT %s
         '''
-        params = [(chat_id,) for chat_id in chat_ids]
+        # Without an archive only the ids are needed, so the content is
+        # never read.
+        if archive is None:
+            query = 'SELECT `chat_id` ' + self._from_query + where
+        else:
+            query = self._select_query + where
+
+        # Each batch is selected on the primary: a lagging replica would hand
+        # back rows that are already deleted, or stale content to archive.
+        purged = 0
+        while True:
+            if archive is None:
+                _, rows = self._fetch_rows(query, (*params, batch_size), primary=True)
+                chat_ids = [row[0] for row in rows]
+            else:
+                chats = self._fetch_all(query, (*params, batch_size), ChatHistory, primary=True)
+                if chats:
+                    archive(chats)
+                chat_ids = [chat.chat_id for chat in chats]
+            if not chat_ids:
+                break
+
+            rows_affected, _ = self._execute(
+                f'''
+                DELETE FROM `chats`
+                WHERE `chat_id` IN ({', '.join(['%s'] * len(chat_ids))})
+                ''',
+                tuple(chat_ids)
+            )
+            purged += rows_affected
 
-        with self._connection.cursor() as cursor:
-            rows = cursor.executemany(query=query, args=params)
-        self._connection.commit()
-        if rows is None:
-            return False
-        return rows > 0
+            if len(chat_ids) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
 
-    def __del__(self):
-        self._connection.close()
+        if purged and self._tail_cache is not None:
+            self._tail_cache.invalidate(user_id)
+        return purged
 
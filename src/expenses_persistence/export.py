@@ -0,0 +1,96 @@
+from typing import Any
+from typing import BinaryIO
+from typing import Sequence
+from typing import TextIO
+
+import csv
+import os
+
+FORMATS = ('csv', 'parquet', 'arrow')
+
+# Arrow types for the exported expense columns. Values are converted per
+# column, so MySQL (Decimal, datetime) and SQLite (float, text) rows end up
+# with the same schema.
+EXPENSE_ARROW_TYPES = {
+    'expense_id': ('int64',),
+    'expense_name': ('string',),
+    'expense_amount': ('decimal128', 12, 2),
+    'month_year': ('string',),
+    'user_id': ('int64',),
+    'exp_category_id': ('int64',),
+    'category_name': ('string',),
+    'status': ('int8',),
+    'created_at': ('timestamp', 's'),
+    'updated_at': ('timestamp', 's')
+}
+
+
+class _CSVWriter:
+    def __init__(self, destination: str | os.PathLike | TextIO, column_names: Sequence[str]):
+        self._owned = isinstance(destination, (str, os.PathLike))
+        self._stream = open(destination, 'w', newline='') if self._owned else destination
+        self._writer = csv.writer(self._stream)
+        self._writer.writerow(column_names)
+
+    def write(self, rows: Sequence[tuple]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        if self._owned:
+            self._stream.close()
+        else:
+            self._stream.flush()
+
+
+class _ArrowWriter:
+    def __init__(self,
+                 destination: str | os.PathLike | BinaryIO,
+                 column_names: Sequence[str],
+                 format: str,
+                 types: dict[str, tuple]):
+        try:
+            import pyarrow
+        except ImportError as error:
+            raise ImportError(f'Exporting to {format} requires pyarrow; '
+                              f'install expenses_persistence[export]') from error
+
+        self._pyarrow = pyarrow
+        fields = []
+        for name in column_names:
+            factory, *arguments = types.get(name, ('string',))
+            fields.append((name, getattr(pyarrow, factory)(*arguments)))
+        self._schema = pyarrow.schema(fields)
+        if isinstance(destination, os.PathLike):
+            destination = os.fspath(destination)
+        if format == 'parquet':
+            import pyarrow.parquet
+
+            self._writer = pyarrow.parquet.ParquetWriter(destination, self._schema)
+        else:
+            self._writer = pyarrow.ipc.new_file(destination, self._schema)
+        self._format = format
+
+    def write(self, rows: Sequence[tuple]) -> None:
+        pyarrow = self._pyarrow
+        # Columns are built straight from the row tuples and cast to the
+        # export schema; no entity objects are created.
+        arrays = [pyarrow.array(values).cast(field.type) for values, field in zip(zip(*rows), self._schema)]
+        batch = pyarrow.RecordBatch.from_arrays(arrays, schema=self._schema)
+        if self._format == 'parquet':
+            self._writer.write_table(pyarrow.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def open_writer(destination: Any,
+                format: str,
+                column_names: Sequence[str],
+                types: dict[str, tuple] = None) -> Any:
+    if format not in FORMATS:
+        raise ValueError(f'format must be one of {FORMATS}')
+    if format == 'csv':
+        return _CSVWriter(destination, column_names)
+    return _ArrowWriter(destination, column_names, format, types or {})
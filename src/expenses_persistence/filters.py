@@ -0,0 +1,131 @@
+from functools import lru_cache
+from typing import Any
+from typing import NamedTuple
+from typing import Sequence
+
+RESERVED = ('order_by', 'limit')
+
+OPERATORS = {
+    'eq': '=',
+    'ne': '<>',
+    'lt': '<',
+    'lte': '<=',
+    'gt': '>',
+    'gte': '>=',
+    'in': 'IN',
+    'not_in': 'NOT IN',
+    'isnull': None
+}
+
+
+class Filter(NamedTuple):
+    where: str
+    order_by: str
+    limit: str
+    params: tuple
+
+    @property
+    def sql(self) -> str:
+        return self.where + self.order_by + self.limit
+
+
+class FilterBuilder:
+    # Keys are `column` or `column__operator`; `order_by` takes column names
+    # (prefixed with '-' for descending) and `limit` a row count. Only
+    # whitelisted columns reach the SQL, and since the text depends only on
+    # the filter shape it is compiled once per shape.
+    def __init__(self, columns: dict[str, str]):
+        self._columns = dict(columns)
+        self._compile = lru_cache(maxsize=512)(self._compile_shape)
+        self._select = lru_cache(maxsize=128)(self._compile_select)
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return tuple(self._columns)
+
+    def column(self, name: str) -> str:
+        try:
+            return self._columns[name]
+        except KeyError:
+            raise ValueError(f'Unknown column {name!r}; expected one of {sorted(self._columns)}') from None
+
+    def _compile_select(self, fields: tuple[str, ...]) -> str:
+        if not fields:
+            raise ValueError('fields must name at least one column')
+        if len(set(fields)) != len(fields):
+            raise ValueError('fields must not repeat a column')
+        return ',\n            '.join(f'{self.column(name)} AS `{name}`' for name in fields)
+
+    def select(self, fields: Sequence[str]) -> str:
+        if isinstance(fields, str):
+            fields = (fields,)
+        return self._select(tuple(fields))
+
+    def _compile_shape(self,
+                       conditions: tuple[tuple[str, str, Any], ...],
+                       order_by: tuple[str, ...],
+                       has_limit: bool) -> tuple[str, str, str]:
+        clauses = []
+        for name, operator, arity in conditions:
+            column = self.column(name)
+            if operator == 'isnull':
+                clauses.append(f'{column} IS NULL' if arity else f'{column} IS NOT NULL')
+            elif operator in ('in', 'not_in'):
+                if arity == 0:
+                    clauses.append('1 = 0' if operator == 'in' else '1 = 1')
+                else:
+                    clauses.append(f'{column} {OPERATORS[operator]} ({", ".join(["%s"] * arity)})')
+            else:
+                clauses.append(f'{column} {OPERATORS[operator]} %s')
+
+        orderings = []
+        for name in order_by:
+            descending = name.startswith('-')
+            orderings.append(f'{self.column(name.lstrip("-"))} {"DESC" if descending else "ASC"}')
+
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        ordering = ' ORDER BY ' + ', '.join(orderings) if orderings else ''
+        limit = ' LIMIT %s' if has_limit else ''
+        return where, ordering, limit
+
+    def build(self, kwargs: dict[str, Any], ordering: bool = True) -> Filter:
+        conditions = []
+        params = []
+        for key, value in kwargs.items():
+            if key in RESERVED:
+                continue
+            name, _, operator = key.partition('__')
+            operator = operator or 'eq'
+            if operator not in OPERATORS:
+                raise ValueError(f'Unknown filter operator {operator!r} in {key!r}; expected one of {sorted(OPERATORS)}')
+
+            if operator == 'eq' and value is None:
+                conditions.append((name, 'isnull', True))
+            elif operator == 'isnull':
+                conditions.append((name, 'isnull', bool(value)))
+            elif operator in ('in', 'not_in'):
+                values = tuple(value)
+                conditions.append((name, operator, len(values)))
+                params.extend(values)
+            else:
+                conditions.append((name, operator, None))
+                params.append(value)
+
+        order_by = kwargs.get('order_by', ())
+        limit = kwargs.get('limit')
+        if not ordering and (order_by or limit is not None):
+            raise ValueError('order_by and limit are not supported here')
+        if isinstance(order_by, str):
+            order_by = (order_by,)
+        if limit is not None:
+            params.append(int(limit))
+
+        where, order_sql, limit_sql = self._compile(tuple(conditions), tuple(order_by), limit is not None)
+        return Filter(where, order_sql, limit_sql, tuple(params))
+
+    def references(self, kwargs: dict[str, Any], column: str) -> bool:
+        order_by = kwargs.get('order_by', ())
+        if isinstance(order_by, str):
+            order_by = (order_by,)
+        return (any(key.partition('__')[0] == column for key in kwargs if key not in RESERVED)
+                or any(name.lstrip('-') == column for name in order_by))
@@ -0,0 +1,213 @@
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+
+import bisect
+import logging
+import sys
+import threading
+import time
+
+slow_query_logger = logging.getLogger('expenses_persistence.slow_query')
+
+
+@dataclass(frozen=True)
+class QueryEvent:
+    repository: str
+    operation: str
+    query: str
+    pool_wait: float
+    execute: float
+    fetch: float
+    mapping: float
+    rows: int
+    error: BaseException = None
+
+    @property
+    def total(self) -> float:
+        return self.pool_wait + self.execute + self.fetch + self.mapping
+
+
+class LatencyHistogram:
+    # Bucket upper bounds grow by ~1.5x from 50us to ~2 minutes, which keeps
+    # percentile estimates within one bucket width of the real value.
+    BOUNDS = tuple(0.00005 * 1.5 ** exponent for exponent in range(37))
+
+    def __init__(self):
+        self._counts = [0] * (len(self.BOUNDS) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.BOUNDS, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def _percentile(self, percent: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = max(1, round(self.count * percent / 100))
+        seen = 0
+        for index, bucket in enumerate(self._counts):
+            seen += bucket
+            if seen >= rank:
+                return min(self.BOUNDS[index], self.max) if index < len(self.BOUNDS) else self.max
+        return self.max
+
+    def percentile(self, percent: float) -> float:
+        with self._lock:
+            return self._percentile(percent)
+
+    def snapshot(self) -> dict[str, float]:
+        # Taken under one lock so the figures describe the same observations.
+        with self._lock:
+            return {
+                'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self._percentile(50),
+                'p90': self._percentile(90),
+                'p99': self._percentile(99),
+                'max': self.max
+            }
+
+
+class Instrumentation:
+    def __init__(self,
+                 slow_query_threshold: float = None,
+                 histograms: bool = True,
+                 logger: logging.Logger = slow_query_logger):
+        self._slow_query_threshold = slow_query_threshold
+        self._histograms_enabled = histograms
+        self._logger = logger
+        # Hooks are replaced rather than mutated, so record() can iterate
+        # them without holding the lock.
+        self._hooks: tuple[Callable[[QueryEvent], None], ...] = ()
+        self._lock = threading.Lock()
+        self.histograms: dict[str, LatencyHistogram] = {}
+
+    def add_hook(self, hook: Callable[[QueryEvent], None]) -> None:
+        with self._lock:
+            self._hooks += (hook,)
+
+    def remove_hook(self, hook: Callable[[QueryEvent], None]) -> None:
+        with self._lock:
+            hooks = list(self._hooks)
+            hooks.remove(hook)
+            self._hooks = tuple(hooks)
+
+    def record(self, event: QueryEvent) -> None:
+        if self._histograms_enabled:
+            key = f'{event.repository}.{event.operation}'
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                with self._lock:
+                    histogram = self.histograms.setdefault(key, LatencyHistogram())
+            histogram.observe(event.total)
+
+        if self._slow_query_threshold is not None and event.total >= self._slow_query_threshold:
+            self._logger.warning(
+                'Slow query in %s.%s: %.1f ms (pool wait %.1f, execute %.1f, fetch %.1f, mapping %.1f), '
+                '%d rows: %s',
+                event.repository, event.operation, event.total * 1000, event.pool_wait * 1000,
+                event.execute * 1000, event.fetch * 1000, event.mapping * 1000, event.rows,
+                ' '.join(event.query.split())
+            )
+
+        # The statement has already run, and may have committed, so a broken
+        # hook must not turn it into a failed call.
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception:
+                self._logger.exception('Instrumentation hook %r failed for %s.%s',
+                                       hook, event.repository, event.operation)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            histograms = list(self.histograms.items())
+        return {key: histogram.snapshot() for key, histogram in histograms}
+
+
+def _operation_name(depth: int) -> str:
+    # The public repository method is the first caller that is not a
+    # private helper, lambda or generator expression.
+    frame = sys._getframe(depth)
+    while frame is not None:
+        name = frame.f_code.co_name
+        if not name.startswith('_') and not name.startswith('<'):
+            return name
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryTimer:
+    __slots__ = ('_instrumentation', '_repository', '_operation', '_query', '_last', '_phases', '_rows')
+
+    def __init__(self, instrumentation: Instrumentation, repository: str, query: str):
+        self._instrumentation = instrumentation
+        self._repository = repository
+        self._operation = _operation_name(3)
+        self._query = query
+        self._phases = {'pool_wait': 0.0, 'execute': 0.0, 'fetch': 0.0, 'mapping': 0.0}
+        self._rows = 0
+        self._last = time.perf_counter()
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self._phases[phase] += now - self._last
+        self._last = now
+
+    def pause(self) -> None:
+        # Time spent while a streaming caller holds the generator is theirs.
+        self._last = time.perf_counter()
+
+    def count(self, rows: int) -> None:
+        self._rows += rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._instrumentation.record(QueryEvent(
+            repository=self._repository,
+            operation=self._operation,
+            query=self._query,
+            rows=self._rows,
+            error=exc_value,
+            **self._phases
+        ))
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def mark(self, phase: str) -> None:
+        pass
+
+    def pause(self) -> None:
+        pass
+
+    def count(self, rows: int) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+def query_timer(instrumentation: Instrumentation, repository: str, query: str) -> Any:
+    if instrumentation is None:
+        return NULL_TIMER
+    return QueryTimer(instrumentation, repository, query)
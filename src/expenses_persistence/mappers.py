@@ -0,0 +1,52 @@
+from array import array
+from collections import namedtuple
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any
+from typing import Callable
+from typing import Sequence
+
+
+@lru_cache(maxsize=256)
+def row_mapper(entity_type: type, column_names: tuple[str, ...]) -> Callable[[tuple], Any]:
+    # Compiles `lambda row: entity_type(a=row[0], b=row[1], ...)` once per
+    # query shape, so mapping a row costs one call instead of a zip, a dict
+    # and a **kwargs unpack.
+    if not all(name.isidentifier() for name in column_names) or len(set(column_names)) != len(column_names):
+        return lambda row: entity_type(**dict(zip(column_names, row)))
+
+    arguments = ', '.join(f'{name}=row[{index}]' for index, name in enumerate(column_names))
+    namespace = {'entity_type': entity_type}
+    exec(f'def mapper(row):\n    return entity_type({arguments})\n', namespace)
+    return namespace['mapper']
+
+
+@lru_cache(maxsize=256)
+def projection_type(entity_type: type, fields: tuple[str, ...]) -> type:
+    # Partial rows are plain named tuples; one class per entity and field
+    # list, so repeated projections share it.
+    return namedtuple(f'{entity_type.__name__}Fields', fields)
+
+
+def _pack(values: list[Any], use_numpy: bool) -> Sequence[Any]:
+    typecode = None
+    if values and all(type(value) is int for value in values):
+        typecode = 'q'
+    elif values and all(isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+                        for value in values):
+        typecode = 'd'
+
+    if typecode is None:
+        return values
+
+    packed = array(typecode, [float(value) for value in values] if typecode == 'd' else values)
+    if use_numpy:
+        import numpy
+
+        return numpy.frombuffer(packed, dtype=numpy.int64 if typecode == 'q' else numpy.float64)
+    return packed
+
+
+def to_columns(column_names: Sequence[str], rows: Sequence[tuple], use_numpy: bool = False) -> dict[str, Sequence[Any]]:
+    transposed = list(zip(*rows)) if rows else [()] * len(column_names)
+    return {name: _pack(list(values), use_numpy) for name, values in zip(column_names, transposed)}
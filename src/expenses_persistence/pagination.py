@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import date
+from datetime import datetime
+from typing import Any
+
+import base64
+import binascii
+import json
+
+FORWARD = 'forward'
+BACKWARD = 'backward'
+
+
+class InvalidPageToken(ValueError):
+    pass
+
+
+@dataclass
+class Page:
+    items: list[Any] = field(default_factory=list)
+    next_token: str = None
+    previous_token: str = None
+
+
+@dataclass
+class ChangeBatch:
+    items: list[Any] = field(default_factory=list)
+    # Token for the (updated_at, key) of the last item, to pass to the next
+    # call; unchanged when there was nothing new.
+    watermark: str = None
+    has_more: bool = False
+
+
+def encode_token(sort_value: Any, key_value: Any) -> str:
+    if isinstance(sort_value, (datetime, date)):
+        sort_value = {'dt': sort_value.isoformat()}
+    payload = json.dumps([sort_value, key_value], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_token(token: str) -> tuple[Any, Any]:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        sort_value, key_value = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as error:
+        raise InvalidPageToken(f'Malformed page token: {token!r}') from error
+
+    if isinstance(sort_value, dict):
+        try:
+            sort_value = datetime.fromisoformat(sort_value['dt'])
+        except (KeyError, TypeError, ValueError) as error:
+            raise InvalidPageToken(f'Malformed page token: {token!r}') from error
+    return sort_value, key_value
@@ -0,0 +1,313 @@
+from .backends import MySQLBackend
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from contextvars import Token
+from dataclasses import asdict
+from dataclasses import dataclass
+from pymysql.connections import Connection
+from typing import Any
+from typing import Iterator
+
+import threading
+import time
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolTimeoutError(PoolError):
+    pass
+
+
+@dataclass(frozen=True)
+class PoolStats:
+    size: int
+    idle: int
+    in_use: int
+    waiting: int
+    min_size: int
+    max_size: int
+    created: int
+    closed: int
+    checkouts: int
+    timeouts: int
+    failed_health_checks: int
+    wait_time: float
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class ConnectionPool:
+    def __init__(self,
+                 host: str = None,
+                 user: str = None,
+                 password: str = None,
+                 db_name: str = None,
+                 db_port: int = None,
+                 min_size: int = 1,
+                 max_size: int = 10,
+                 timeout: float = 30.0,
+                 max_idle: float = 300.0,
+                 health_check_after: float = 5.0,
+                 backend: Any = None,
+                 lazy: bool = False,
+                 **connect_kwargs):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        if min_size < 0 or min_size > max_size:
+            raise ValueError('min_size must be between 0 and max_size')
+
+        if backend is None:
+            backend = MySQLBackend(host=host, user=user, password=password,
+                                   db_name=db_name, db_port=db_port, **connect_kwargs)
+        self._backend = backend
+        if backend.single_connection:
+            min_size = max_size = 1
+
+        self._min_size = min_size
+        self._max_size = max_size
+        self._timeout = timeout
+        self._max_idle = max_idle
+        self._health_check_after = health_check_after
+
+        # Idle connections are (connection, released_at) pairs. Checkout pops
+        # from the right so hot connections get reused and cold ones age out
+        # from the left.
+        self._idle: deque[tuple[Connection, float]] = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed_pool = False
+        self._lock = threading.Condition()
+        self._bound: ContextVar[Connection] = ContextVar(f'bound_connection_{id(self)}', default=None)
+        # Thread that checked out each connection in use, and the connections
+        # currently reading an unbuffered result, both keyed by id().
+        self._owners: dict[int, int] = {}
+        self._streaming: set[int] = set()
+
+        self._created = 0
+        self._closed = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._failed_health_checks = 0
+        self._wait_time = 0.0
+
+        # A lazy pool opens its first connection on first checkout, so
+        # constructing it never blocks on the database.
+        if not lazy:
+            for _ in range(min_size):
+                self._idle.append((self._connect(), time.monotonic()))
+                self._size += 1
+
+    @property
+    def backend(self) -> Any:
+        return self._backend
+
+    def _connect(self) -> Connection:
+        connection = self._backend.connect()
+        with self._lock:
+            self._created += 1
+        return connection
+
+    def _close_quietly(self, connection: Connection) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._closed += 1
+
+    def _evict_idle(self) -> list[Connection]:
+        # Must be called with the lock held; the caller closes the returned
+        # connections once the lock is released.
+        evicted = []
+        now = time.monotonic()
+        while self._idle and self._size > self._min_size:
+            connection, released_at = self._idle[0]
+            if now - released_at < self._max_idle:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            evicted.append(connection)
+        return evicted
+
+    def _check(self, connection: Connection) -> Connection:
+        try:
+            connection.ping(reconnect=False)
+            return connection
+        except Exception:
+            with self._lock:
+                self._failed_health_checks += 1
+            self._close_quietly(connection)
+            return self._connect()
+
+    def acquire(self, timeout: float = None) -> Connection:
+        timeout = self._timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        connection = None
+        released_at = None
+        evicted = []
+
+        with self._lock:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._closed_pool:
+                        raise PoolError('Connection pool is closed')
+
+                    evicted.extend(self._evict_idle())
+
+                    if self._idle:
+                        connection, released_at = self._idle.pop()
+                        break
+
+                    if self._size < self._max_size:
+                        self._size += 1
+                        break
+
+                    # Only this thread could release its own connections, so
+                    # waiting would always end in a timeout.
+                    if list(self._owners.values()).count(threading.get_ident()) >= self._max_size:
+                        raise PoolError(
+                            f'All {self._max_size} connections are checked out by this thread; '
+                            f'an open iter_* stream holds one until it is exhausted or closed'
+                        )
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f'Timed out after {timeout}s waiting for a connection '
+                            f'({self._max_size} in use)'
+                        )
+                    self._lock.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+        for stale in evicted:
+            self._close_quietly(stale)
+
+        try:
+            if connection is None:
+                connection = self._connect()
+            elif time.monotonic() - released_at >= self._health_check_after:
+                connection = self._check(connection)
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+
+        with self._lock:
+            self._owners[id(connection)] = threading.get_ident()
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_time += time.monotonic() - started
+        return connection
+
+    def release(self, connection: Connection, discard: bool = False) -> None:
+        with self._lock:
+            self._owners.pop(id(connection), None)
+            self._in_use -= 1
+            if discard or self._closed_pool:
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+        if discard or self._closed_pool:
+            self._close_quietly(connection)
+
+    def bind(self, connection: Connection) -> Token:
+        return self._bound.set(connection)
+
+    def unbind(self, token: Token) -> None:
+        self._bound.reset(token)
+
+    def bound_connection(self) -> Connection:
+        return self._bound.get()
+
+    @contextmanager
+    def connection(self, timeout: float = None, read_only: bool = False) -> Iterator[Connection]:
+        # Inside a unit of work every operation shares its connection, and
+        # the unit of work owns commit, rollback and release. read_only is
+        # only a routing hint for ReplicaRouter; a single pool serves both.
+        bound = self._bound.get()
+        if bound is not None:
+            if id(bound) in self._streaming:
+                raise PoolError('The unit of work connection is still streaming an iter_* result; '
+                                'exhaust or close the iterator before running other queries')
+            yield bound
+            return
+
+        connection = self.acquire(timeout=timeout)
+        discard = False
+        try:
+            yield connection
+        except BaseException:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+            raise
+        else:
+            # Without autocommit a plain SELECT leaves a read snapshot open;
+            # end it so the next borrower sees fresh data.
+            if not connection.get_autocommit():
+                try:
+                    connection.rollback()
+                except Exception:
+                    discard = True
+        finally:
+            self.release(connection, discard=discard)
+
+    @contextmanager
+    def streaming(self, connection: Connection) -> Iterator[Connection]:
+        # MySQL cannot run another statement on a connection until its
+        # unbuffered result is drained, so a bound connection is not handed
+        # out while it streams.
+        with self._lock:
+            self._streaming.add(id(connection))
+        try:
+            yield connection
+        finally:
+            with self._lock:
+                self._streaming.discard(id(connection))
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            return PoolStats(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._in_use,
+                waiting=self._waiting,
+                min_size=self._min_size,
+                max_size=self._max_size,
+                created=self._created,
+                closed=self._closed,
+                checkouts=self._checkouts,
+                timeouts=self._timeouts,
+                failed_health_checks=self._failed_health_checks,
+                wait_time=self._wait_time
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed_pool = True
+            idle = [connection for connection, _ in self._idle]
+            self._size -= len(idle)
+            self._idle.clear()
+            self._lock.notify_all()
+
+        for connection in idle:
+            self._close_quietly(connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,109 @@
+from .pool import ConnectionPool
+from .pool import PoolStats
+from contextlib import contextmanager
+from contextvars import ContextVar
+from contextvars import Token
+from pymysql.connections import Connection
+from typing import Any
+from typing import ContextManager
+from typing import Iterator
+from typing import Sequence
+
+import itertools
+import threading
+import time
+
+
+class ReplicaRouter:
+    def __init__(self,
+                 primary: ConnectionPool,
+                 replicas: Sequence[ConnectionPool] = (),
+                 pin_window: float = 2.0):
+        if pin_window < 0:
+            raise ValueError('pin_window must not be negative')
+        self._primary = primary
+        self._replicas = tuple(replicas)
+        self._pin_window = pin_window
+        self._next_replica = itertools.cycle(range(len(self._replicas))) if self._replicas else None
+        self._lock = threading.Lock()
+        # The time of the last write is kept per context, so a thread or task
+        # that has just written keeps reading from the primary, while other
+        # sessions go on using the replicas.
+        self._last_write: ContextVar[float] = ContextVar(f'last_write_{id(self)}', default=None)
+
+    @property
+    def primary(self) -> ConnectionPool:
+        return self._primary
+
+    @property
+    def replicas(self) -> tuple[ConnectionPool, ...]:
+        return self._replicas
+
+    @property
+    def backend(self) -> Any:
+        return self._primary.backend
+
+    def mark_write(self) -> None:
+        self._last_write.set(time.monotonic())
+
+    def pinned(self) -> bool:
+        last_write = self._last_write.get()
+        return last_write is not None and time.monotonic() - last_write < self._pin_window
+
+    def _replica(self) -> ConnectionPool:
+        with self._lock:
+            return self._replicas[next(self._next_replica)]
+
+    def acquire(self, timeout: float = None) -> Connection:
+        return self._primary.acquire(timeout=timeout)
+
+    def release(self, connection: Connection, discard: bool = False) -> None:
+        # Only units of work check connections out directly, and those write.
+        try:
+            self._primary.release(connection, discard=discard)
+        finally:
+            self.mark_write()
+
+    def bind(self, connection: Connection) -> Token:
+        return self._primary.bind(connection)
+
+    def unbind(self, token: Token) -> None:
+        self._primary.unbind(token)
+
+    def bound_connection(self) -> Connection:
+        return self._primary.bound_connection()
+
+    @contextmanager
+    def connection(self, timeout: float = None, read_only: bool = False) -> Iterator[Connection]:
+        if read_only and self._replicas and self._primary.bound_connection() is None and not self.pinned():
+            with self._replica().connection(timeout=timeout) as connection:
+                yield connection
+            return
+
+        try:
+            with self._primary.connection(timeout=timeout) as connection:
+                yield connection
+        finally:
+            if not read_only:
+                self.mark_write()
+
+    def streaming(self, connection: Connection) -> ContextManager[Connection]:
+        return self._primary.streaming(connection)
+
+    def stats(self) -> PoolStats:
+        return self._primary.stats()
+
+    def replica_stats(self) -> list[PoolStats]:
+        return [replica.stats() for replica in self._replicas]
+
+    def close(self) -> None:
+        self._primary.close()
+        for replica in self._replicas:
+            replica.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,13 @@
+from decimal import Decimal
+from typing import Any
+from typing import NamedTuple
+
+GROUP_BY_COLUMNS = ('month_year', 'exp_category_id')
+
+
+class ExpenseTotal(NamedTuple):
+    month_year: Any
+    exp_category_id: Any
+    total: Decimal
+    count: int
+    average: Decimal
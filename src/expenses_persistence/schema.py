@@ -0,0 +1,263 @@
+from .pagination import FORWARD
+from .pagination import encode_token
+from .pool import ConnectionPool
+from typing import Any
+
+TABLE_NAMES = ('users', 'expense_categories', 'expenses', 'chats')
+
+MYSQL_SCHEMA = {
+    'users': ['''
+        CREATE TABLE IF NOT EXISTS `users` (
+            `user_id` INT UNSIGNED NOT NULL AUTO_INCREMENT,
+            `username` VARCHAR(255) NOT NULL,
+            `password` VARCHAR(255) NOT NULL,
+            `status` TINYINT NOT NULL DEFAULT 1,
+            `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (`user_id`)
+        )
+    '''],
+    'expense_categories': ['''
+        CREATE TABLE IF NOT EXISTS `expense_categories` (
+            `exp_category_id` INT UNSIGNED NOT NULL AUTO_INCREMENT,
+            `category_name` VARCHAR(255) NOT NULL,
+            `status` TINYINT NOT NULL DEFAULT 1,
+            `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (`exp_category_id`)
+        )
+    '''],
+    'expenses': ['''
+        CREATE TABLE IF NOT EXISTS `expenses` (
+            `expense_id` INT UNSIGNED NOT NULL AUTO_INCREMENT,
+            `expense_name` VARCHAR(255) NOT NULL,
+            `expense_amount` DECIMAL(12, 2) NOT NULL,
+            `month_year` CHAR(7) NOT NULL,
+            `user_id` INT UNSIGNED NOT NULL,
+            `exp_category_id` INT UNSIGNED NOT NULL,
+            `status` TINYINT NOT NULL DEFAULT 1,
+            `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (`expense_id`)
+        )
+    '''],
+    'chats': ['''
+        CREATE TABLE IF NOT EXISTS `chats` (
+            `chat_id` INT UNSIGNED NOT NULL AUTO_INCREMENT,
+            `user_id` INT UNSIGNED NOT NULL,
+            `role_id` TINYINT NOT NULL,
+            `content` TEXT NOT NULL,
+            `status` TINYINT NOT NULL DEFAULT 1,
+            `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (`chat_id`)
+        )
+    ''']
+}
+
+
+def _sqlite_touch_trigger(table: str, key_column: str) -> str:
+    # SQLite has no ON UPDATE CURRENT_TIMESTAMP; a trigger keeps updated_at
+    # moving unless the statement set it explicitly.
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS `{table}_touch_updated_at`
+        AFTER UPDATE ON `{table}`
+        FOR EACH ROW WHEN NEW.`updated_at` = OLD.`updated_at`
+        BEGIN
+            UPDATE `{table}` SET `updated_at` = CURRENT_TIMESTAMP WHERE `{key_column}` = NEW.`{key_column}`;
+        END
+    '''
+
+
+SQLITE_SCHEMA = {
+    'users': ['''
+        CREATE TABLE IF NOT EXISTS `users` (
+            `user_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+            `username` TEXT NOT NULL,
+            `password` TEXT NOT NULL,
+            `status` INTEGER NOT NULL DEFAULT 1,
+            `created_at` TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `updated_at` TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''', _sqlite_touch_trigger('users', 'user_id')],
+    'expense_categories': ['''
+        CREATE TABLE IF NOT EXISTS `expense_categories` (
+            `exp_category_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+            `category_name` TEXT NOT NULL,
+            `status` INTEGER NOT NULL DEFAULT 1,
+            `created_at` TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `updated_at` TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''', _sqlite_touch_trigger('expense_categories', 'exp_category_id')],
+    'expenses': ['''
+        CREATE TABLE IF NOT EXISTS `expenses` (
+            `expense_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+            `expense_name` TEXT NOT NULL,
+            `expense_amount` NUMERIC NOT NULL,
+            `month_year` TEXT NOT NULL,
+            `user_id` INTEGER NOT NULL,
+            `exp_category_id` INTEGER NOT NULL,
+            `status` INTEGER NOT NULL DEFAULT 1,
+            `created_at` TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `updated_at` TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''', _sqlite_touch_trigger('expenses', 'expense_id')],
+    'chats': ['''
+        CREATE TABLE IF NOT EXISTS `chats` (
+            `chat_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+            `user_id` INTEGER NOT NULL,
+            `role_id` INTEGER NOT NULL,
+            `content` TEXT NOT NULL,
+            `status` INTEGER NOT NULL DEFAULT 1,
+            `created_at` TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `updated_at` TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''', _sqlite_touch_trigger('chats', 'chat_id')]
+}
+
+SCHEMAS = {
+    'mysql': MYSQL_SCHEMA,
+    'sqlite': SQLITE_SCHEMA
+}
+
+# (name, columns, unique) per table, matching the repositories' access paths:
+# expenses by user and month, recent chats by user, login by username, the
+# category JOIN and the updated_at change feeds. InnoDB and SQLite both append
+# the primary key to secondary indexes, which covers the key tie-breakers.
+INDEXES = {
+    'users': [
+        ('uq_users_username', ('username',), True)
+    ],
+    'expense_categories': [],
+    'expenses': [
+        ('idx_expenses_user_month', ('user_id', 'month_year'), False),
+        ('idx_expenses_user_created', ('user_id', 'created_at'), False),
+        ('idx_expenses_category', ('exp_category_id',), False),
+        ('idx_expenses_updated_at', ('updated_at',), False)
+    ],
+    'chats': [
+        ('idx_chats_user_created', ('user_id', 'created_at'), False),
+        ('idx_chats_updated_at', ('updated_at',), False)
+    ]
+}
+
+
+def _existing_indexes(cursor: Any, backend: str, table: str) -> set[str]:
+    if backend == 'sqlite':
+        cursor.execute("SELECT `name` FROM `sqlite_master` WHERE `type` = 'index' AND `tbl_name` = %s", (table,))
+    else:
+        cursor.execute('''
+            SELECT DISTINCT `INDEX_NAME`
+            FROM `information_schema`.`STATISTICS`
+            WHERE `TABLE_SCHEMA` = DATABASE() AND `TABLE_NAME` = %s
+        ''', (table,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def create_indexes(pool: ConnectionPool) -> list[str]:
+    # Adds whichever indexes are missing, so it also migrates tables created
+    # by older versions. Returns the names of the indexes it created.
+    created = []
+    with pool.connection() as connection, connection.cursor() as cursor:
+        for table in TABLE_NAMES:
+            existing = _existing_indexes(cursor, pool.backend.name, table)
+            for name, columns, unique in INDEXES[table]:
+                if name in existing:
+                    continue
+                column_list = ', '.join(f'`{column}`' for column in columns)
+                cursor.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX `{name}` ON `{table}` ({column_list})')
+                created.append(name)
+    return created
+
+
+def create_schema(pool: ConnectionPool, drop_existing: bool = False) -> None:
+    schema = SCHEMAS[pool.backend.name]
+    with pool.connection() as connection, connection.cursor() as cursor:
+        if drop_existing:
+            for table in reversed(TABLE_NAMES):
+                cursor.execute(f'DROP TABLE IF EXISTS `{table}`')
+        for table in TABLE_NAMES:
+            for statement in schema[table]:
+                cursor.execute(statement)
+    create_indexes(pool)
+
+
+def access_paths(backend: Any) -> list[tuple[str, str, tuple]]:
+    # One representative query per repository access path, built by the
+    # same class attributes and query builders the repository methods use.
+    from .expense_repo import ChatHistoryRepositoryImplementation as Chats
+    from .expense_repo import ExpenseCategoriesRepositoryImplementation as Categories
+    from .expense_repo import ExpenseRepositoryImplementation as Expenses
+    from .expense_repo import UserRepositoryImplementation as Users
+
+    token = encode_token('2024-01-01 00:00:00', 1)
+    paths = [
+        ('expenses.get', Expenses._select_query + Expenses._get_condition, (1,)),
+        ('expenses.get(cached categories)', Expenses._select_without_category_query + Expenses._get_condition, (1,)),
+        ('categories.get', Categories._select_query + Categories._get_condition, (1,)),
+        ('users.get', Users._select_query + Users._get_condition, (1,)),
+        ('chats.get', Chats._select_query + Chats._get_condition, (1,))
+    ]
+    for name, repository, kwargs in (
+            ('expenses.get_by(user_id)', Expenses, {'user_id': 1}),
+            ('expenses.get_by(user_id, month_year)', Expenses, {'user_id': 1, 'month_year': '2024-01'}),
+            ('expenses.get_by(exp_category_id)', Expenses, {'exp_category_id': 1}),
+            ('users.get_by(username)', Users, {'username': 'user'}),
+            ('chats.get_by(user_id)', Chats, {'user_id': 1})):
+        filters = repository._filters.build(kwargs)
+        paths.append((name, repository._select_query + filters.sql, filters.params))
+
+    for name, repository, key_column, page_token in (
+            ('expenses.page_by(user_id)', Expenses, 'expense_id', None),
+            ('expenses.page_by(user_id, token)', Expenses, 'expense_id', token),
+            ('chats.page_by(user_id)', Chats, 'chat_id', None),
+            ('chats.page_by(user_id, token)', Chats, 'chat_id', token)):
+        filters = repository._filters.build({'user_id': 1}, ordering=False)
+        paths.append((name, *repository._page_query(repository._select_query, filters, 'created_at', key_column,
+                                                    50, page_token, FORWARD)))
+
+    for name, repository, select_query, key_column in (
+            ('expenses.changes_since', Expenses, Expenses._select_query, 'expense_id'),
+            ('chats.changes_since', Chats, Chats._select_query, 'chat_id')):
+        filters = repository._filters.build({}, ordering=False)
+        paths.append((name, *repository._changes_query(select_query, filters, key_column, token, 1000, 5.0, backend)))
+
+    paths += [
+        ('expenses.totals(user_id, months)', *Expenses._totals_query(('month_year',), 1, '2024-01', '2024-12')),
+        ('chats.get_recent', Chats._recent_query, (1, 20))
+    ]
+    return paths
+
+
+def _table_scans(cursor: Any, backend: str, query: str, params: tuple) -> list[str]:
+    # Also reports sorts the index cannot serve, which read every matching
+    # row before the LIMIT applies.
+    if backend == 'sqlite':
+        cursor.execute('EXPLAIN QUERY PLAN ' + query, params)
+        # 'SCAN t' reads the whole table; 'SCAN t USING INDEX' walks an index
+        # in order, which the LIMITed queries rely on.
+        return [row[-1] for row in cursor.fetchall()
+                if (row[-1].startswith('SCAN ') and 'USING' not in row[-1])
+                or row[-1].startswith('USE TEMP B-TREE FOR ORDER BY')]
+
+    cursor.execute('EXPLAIN ' + query, params)
+    columns = [column[0] for column in cursor.description]
+    scans = []
+    for row in cursor.fetchall():
+        plan = dict(zip(columns, row))
+        if plan.get('type') == 'ALL':
+            scans.append(f'full scan of {plan.get("table")} ({plan.get("rows")} rows)')
+        if 'Using filesort' in (plan.get('Extra') or ''):
+            scans.append(f'filesort on {plan.get("table")} ({plan.get("rows")} rows)')
+    return scans
+
+
+def check_schema(pool: ConnectionPool) -> dict[str, list[str]]:
+    # Maps each access path to the table scans in its plan; an empty list
+    # means the query is served by an index. MySQL may choose a scan for
+    # tiny tables, so check against representative data.
+    results = {}
+    with pool.connection() as connection, connection.cursor() as cursor:
+        for name, query, params in access_paths(pool.backend):
+            results[name] = _table_scans(cursor, pool.backend.name, query, params)
+    return results
@@ -0,0 +1,74 @@
+from .pool import ConnectionPool
+from contextvars import Token
+from pymysql.connections import Connection
+from typing import Callable
+
+# Callbacks to run once the unit of work holding a connection commits, keyed
+# by id() of that connection while it is bound.
+_after_commit: dict[int, list[Callable[[], None]]] = {}
+
+
+def after_commit(connection: Connection, callback: Callable[[], None]) -> None:
+    # Outside a unit of work the statement has already committed.
+    callbacks = _after_commit.get(id(connection))
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
+
+
+class UnitOfWork:
+    def __init__(self, pool: ConnectionPool, timeout: float = None):
+        self._pool = pool
+        self._timeout = timeout
+        self._connection: Connection = None
+        self._token: Token = None
+
+    @property
+    def connection(self) -> Connection:
+        return self._connection
+
+    def __enter__(self):
+        # A nested unit of work on the same pool joins the outer one.
+        if self._pool.bound_connection() is not None:
+            return self
+
+        self._connection = self._pool.acquire(timeout=self._timeout)
+        try:
+            self._connection.begin()
+        except BaseException:
+            self._pool.release(self._connection, discard=True)
+            self._connection = None
+            raise
+        self._token = self._pool.bind(self._connection)
+        _after_commit[id(self._connection)] = []
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._token is None:
+            return False
+
+        self._pool.unbind(self._token)
+        self._token = None
+        connection, self._connection = self._connection, None
+        callbacks = _after_commit.pop(id(connection), [])
+        discard = False
+        try:
+            if exc_type is None:
+                connection.commit()
+            else:
+                connection.rollback()
+        except BaseException:
+            discard = True
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            self._pool.release(connection, discard=discard)
+
+        if exc_type is None:
+            for callback in callbacks:
+                callback()
+        return False
@@ -0,0 +1,155 @@
+from .expense_repo import ChatHistoryRepositoryImplementation
+from collections import deque
+from expenses_entities import ChatHistory
+from typing import Callable
+
+import atexit
+import logging
+import threading
+import time
+
+write_behind_logger = logging.getLogger('expenses_persistence.write_behind')
+
+
+class BufferFullError(Exception):
+    pass
+
+
+class ChatWriteBuffer:
+    def __init__(self,
+                 repository: ChatHistoryRepositoryImplementation,
+                 max_batch: int = 500,
+                 max_delay: float = 0.5,
+                 max_pending: int = 10000,
+                 on_error: Callable[[list[ChatHistory], BaseException], None] = None,
+                 logger: logging.Logger = write_behind_logger):
+        if max_batch < 1 or max_pending < max_batch:
+            raise ValueError('max_batch must be at least 1 and no larger than max_pending')
+        if max_delay <= 0:
+            raise ValueError('max_delay must be positive')
+        self._repository = repository
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._max_pending = max_pending
+        self._on_error = on_error
+        self._logger = logger
+
+        # Pending chats are (chat, queued_at) pairs, oldest first.
+        self._pending: deque[tuple[ChatHistory, float]] = deque()
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._lock = threading.Condition()
+
+        self.written = 0
+        self.failed = 0
+
+        self._worker = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending) + self._in_flight
+
+    def put(self, chat: ChatHistory, timeout: float = None) -> None:
+        # Returns as soon as the chat is queued. A full buffer blocks the
+        # caller, for at most timeout seconds, until the writer catches up.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while len(self._pending) + self._in_flight >= self._max_pending:
+                if self._closed:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise BufferFullError(f'{self._max_pending} chats are already waiting to be written')
+                self._lock.wait(remaining)
+            if self._closed:
+                raise RuntimeError('ChatWriteBuffer is closed')
+
+            self._pending.append((chat, time.monotonic()))
+            # An idle writer waits with no timeout, so the first chat must
+            # wake it to start the max_delay clock.
+            if len(self._pending) == 1 or len(self._pending) >= self._max_batch:
+                self._lock.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        # Writes everything queued so far; returns False if that took longer
+        # than timeout.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._flush_requested = True
+            self._lock.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return True
+
+    def _next_batch(self) -> list[ChatHistory]:
+        with self._lock:
+            while True:
+                if self._pending:
+                    age = time.monotonic() - self._pending[0][1]
+                    if (len(self._pending) >= self._max_batch or age >= self._max_delay
+                            or self._flush_requested or self._closed):
+                        break
+                    self._lock.wait(self._max_delay - age)
+                elif self._closed:
+                    return None
+                else:
+                    self._flush_requested = False
+                    self._lock.wait()
+
+            count = min(self._max_batch, len(self._pending))
+            batch = [self._pending.popleft()[0] for _ in range(count)]
+            self._in_flight = count
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            try:
+                self._repository.add_batch(batch)
+                written, failed = len(batch), 0
+            except Exception as error:
+                written, failed = 0, len(batch)
+                self._report(batch, error)
+
+            with self._lock:
+                self._in_flight = 0
+                self.written += written
+                self.failed += failed
+                self._lock.notify_all()
+
+    def _report(self, batch: list[ChatHistory], error: BaseException) -> None:
+        if self._on_error is None:
+            self._logger.error('Failed to write %d buffered chats', len(batch), exc_info=error)
+            return
+        try:
+            self._on_error(batch, error)
+        except Exception:
+            self._logger.exception('on_error callback failed for %d buffered chats', len(batch))
+
+    def close(self, timeout: float = None) -> None:
+        # Stops accepting chats, writes what is still queued and waits for
+        # the writer thread to finish.
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._lock.notify_all()
+        self._worker.join(timeout)
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,43 @@
+from expenses_entities import ChatHistory
+from expenses_entities import Expense
+from expenses_persistence import ChatHistoryRepositoryImplementation
+from expenses_persistence import ConnectionPool
+from expenses_persistence import SQLiteBackend
+from expenses_persistence import create_schema
+
+import pytest
+
+
+def make_chat(user_id, content: str, role_id: int = 1) -> ChatHistory:
+    return ChatHistory(chat_id=None, user_id=user_id, role_id=role_id, content=content,
+                       status=None, created_at=None, updated_at=None)
+
+
+def make_expense(name: str, user_id=1, amount=10, month_year: str = '2024-01', category_id=1, id=None) -> Expense:
+    return Expense(expense_id=id, expense_name=name, expense_amount=amount, month_year=month_year,
+                   user_id=user_id, exp_category_id=category_id, category_name=None, status=None,
+                   created_at=None, updated_at=None)
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(backend=SQLiteBackend(str(tmp_path / 'expenses.db')), max_size=4)
+    create_schema(pool)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def chats(pool):
+    repository = ChatHistoryRepositoryImplementation(pool=pool)
+    yield repository
+    repository.close()
+
+
+@pytest.fixture
+def categorised(pool):
+    # One user and one 'food' category for expenses to point at.
+    with pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("INSERT INTO `users` (`username`, `password`) VALUES ('user', 'secret')")
+        cursor.execute("INSERT INTO `expense_categories` (`category_name`) VALUES ('food')")
+    return pool
@@ -0,0 +1,124 @@
+from conftest import make_chat
+from conftest import make_expense
+from contextlib import asynccontextmanager
+
+import asyncio
+import pytest
+
+pytest.importorskip('aiomysql')
+
+from expenses_persistence.async_repo import AsyncChatHistoryRepositoryImplementation  # noqa: E402
+from expenses_persistence.async_repo import AsyncExpenseRepositoryImplementation  # noqa: E402
+
+
+class _Cursor:
+    # Awaitable face of a SQLite cursor, shaped like aiomysql's.
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._cursor.close()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    async def execute(self, query, params=None):
+        return self._cursor.execute(query, params)
+
+    async def executemany(self, query, params):
+        return self._cursor.executemany(query, params)
+
+    async def fetchone(self):
+        return self._cursor.fetchone()
+
+    async def fetchall(self):
+        return self._cursor.fetchall()
+
+
+class _Connection:
+    def __init__(self, connection):
+        self._connection = connection
+        self.calls = []
+
+    def cursor(self):
+        return _Cursor(self._connection.cursor())
+
+    def get_autocommit(self):
+        return True
+
+    async def begin(self):
+        self.calls.append('begin')
+        self._connection.begin()
+
+    async def commit(self):
+        self.calls.append('commit')
+        self._connection.commit()
+
+    async def rollback(self):
+        self.calls.append('rollback')
+        self._connection.rollback()
+
+
+class _Pool:
+    def __init__(self, pool):
+        self.connection = _Connection(pool.backend.connect())
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.connection
+
+
+@pytest.fixture
+def async_pool(pool):
+    return _Pool(pool)
+
+
+def test_reads_share_the_sync_sql_and_never_commit(categorised, async_pool):
+    expenses = AsyncExpenseRepositoryImplementation(async_pool)
+
+    async def run():
+        ids = await expenses.add_batch([make_expense(f'e{i}') for i in range(5)], chunk_size=2)
+        async_pool.connection.calls.clear()
+        expense = await expenses.get(ids[0])
+        by_user = await expenses.get_by(user_id=1, order_by='-expense_id', limit=2)
+        return ids, expense, by_user
+
+    ids, expense, by_user = asyncio.run(run())
+    assert ids == [1, 2, 3, 4, 5]
+    assert (expense.expense_name, expense.user_id, expense.category_name) == ('e0', 1, 'food')
+    assert [expense.expense_name for expense in by_user] == ['e4', 'e3']
+    assert async_pool.connection.calls == []
+
+
+def test_get_by_rejects_unknown_keys(async_pool):
+    chats = AsyncChatHistoryRepositoryImplementation(async_pool)
+    with pytest.raises(ValueError, match='Unknown column'):
+        asyncio.run(chats.get_by(**{'1 = 1 OR chat_id': 1}))
+
+
+def test_delete_batch_runs_chunked_in_one_transaction(async_pool):
+    chats = AsyncChatHistoryRepositoryImplementation(async_pool)
+
+    async def run():
+        for index in range(5):
+            await chats.add(make_chat(1, f'm{index}'))
+        async_pool.connection.calls.clear()
+        deleted = await chats.delete_batch([1, 2, 2, 3], chunk_size=2)
+        return deleted, await chats.get_all()
+
+    deleted, remaining = asyncio.run(run())
+    assert deleted
+    assert [chat.chat_id for chat in remaining] == [4, 5]
+    assert async_pool.connection.calls == ['begin', 'commit']
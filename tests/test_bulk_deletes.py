@@ -0,0 +1,47 @@
+from conftest import make_chat
+from expenses_persistence import UnitOfWork
+
+import pytest
+
+
+def contents(chats) -> list[str]:
+    return [chat.content for chat in chats]
+
+
+def test_delete_batch(chats):
+    chats.add_batch([make_chat(1, f'm{i}') for i in range(5)])
+
+    assert chats.delete_batch([1, 2, 2, 3], chunk_size=2)
+    assert [chat.chat_id for chat in chats.get_all()] == [4, 5]
+    assert not chats.delete_batch([1])
+    assert not chats.delete_batch([])
+
+
+def test_delete_batch_is_atomic(pool, chats):
+    chats.add_batch([make_chat(1, f'm{i}') for i in range(4)])
+
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(pool):
+            chats.delete_batch([1, 2, 3], chunk_size=1)
+            raise RuntimeError('abort')
+    assert len(chats.get_all()) == 4
+
+
+def test_purge_older_than(chats):
+    chats.add_batch([make_chat(1 + i % 2, f'm{i}') for i in range(7)])
+
+    assert chats.purge_older_than('2000-01-01', pause=0) == 0
+    assert chats.purge_older_than('2999-01-01', user_id=1, batch_size=2, pause=0) == 4
+
+    archived = []
+    assert chats.purge_older_than('2999-01-01', batch_size=2, pause=0, archive=archived.extend) == 3
+    assert contents(archived) == ['m1', 'm3', 'm5']
+    assert chats.get_all() is None
+
+
+def test_purge_refuses_to_run_inside_a_unit_of_work(pool, chats):
+    with pytest.raises(ValueError):
+        chats.purge_older_than('2999-01-01', batch_size=0)
+    with UnitOfWork(pool):
+        with pytest.raises(RuntimeError, match='unit of work'):
+            chats.purge_older_than('2999-01-01')
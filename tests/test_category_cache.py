@@ -0,0 +1,106 @@
+from expenses_entities import ExpenseCategory
+from expenses_persistence import CategoryCache
+from expenses_persistence import ExpenseCategoriesRepositoryImplementation
+from expenses_persistence import ExpenseRepositoryImplementation
+
+import pytest
+import time
+
+
+def make_category(name: str, id=None) -> ExpenseCategory:
+    return ExpenseCategory(exp_category_id=id, category_name=name, status=None, created_at=None, updated_at=None)
+
+
+@pytest.fixture
+def seeded(pool):
+    with pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("INSERT INTO `users` (`username`, `password`) VALUES ('user', 'secret')")
+        cursor.execute("INSERT INTO `expense_categories` (`category_name`) VALUES ('food')")
+        cursor.execute('''
+            INSERT INTO `expenses` (`expense_name`, `expense_amount`, `month_year`, `user_id`, `exp_category_id`)
+            VALUES ('lunch', 12.5, '2024-01', 1, 1), ('dinner', 20, '2024-02', 1, 1)
+            ''')
+    return pool
+
+
+def test_cache_expires_and_evicts():
+    cache = CategoryCache(ttl=0.05, max_size=2)
+    cache.put_all([make_category('a', 1), make_category('b', 2)])
+    assert cache.get(1).category_name == 'a'
+    assert [category.category_name for category in cache.get_all()] == ['a', 'b']
+
+    cache.put(make_category('c', 3))
+    assert cache.get(2) is None
+    assert len(cache) == 2
+
+    time.sleep(0.06)
+    assert cache.get(1) is None
+    assert cache.get_all() is None
+
+
+def test_reads_are_served_from_the_cache_and_writes_invalidate(seeded):
+    cache = CategoryCache()
+    categories = ExpenseCategoriesRepositoryImplementation(pool=seeded, cache=cache)
+
+    assert categories.get(1).category_name == 'food'
+    assert categories.get(1).category_name == 'food'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    categories.update(1, make_category('groceries'))
+    assert categories.get(1).category_name == 'groceries'
+    assert [category.category_name for category in categories.get_all()] == ['groceries']
+    categories.add(make_category('rent'))
+    assert [category.category_name for category in categories.get_all()] == ['groceries', 'rent']
+
+
+def test_uncommitted_categories_never_reach_the_cache(seeded):
+    cache = CategoryCache()
+    categories = ExpenseCategoriesRepositoryImplementation(pool=seeded, cache=cache)
+    expenses = ExpenseRepositoryImplementation(pool=seeded, category_cache=cache)
+    assert categories.get(1).category_name == 'food'
+
+    with pytest.raises(RuntimeError):
+        with categories.transaction():
+            categories.update(1, make_category('phantom'))
+            assert categories.get(1).category_name == 'phantom'
+            assert categories.get_all()[0].category_name == 'phantom'
+            assert expenses.get(1).category_name == 'phantom'
+            raise RuntimeError('abort')
+
+    assert categories.get(1).category_name == 'food'
+    assert categories.get_all()[0].category_name == 'food'
+    assert expenses.get(1).category_name == 'food'
+
+
+def test_committed_updates_are_not_hidden_by_a_concurrent_reload(seeded):
+    cache = CategoryCache()
+    categories = ExpenseCategoriesRepositoryImplementation(pool=seeded, cache=cache)
+
+    with categories.transaction():
+        categories.update(1, make_category('groceries'))
+        # Another session caches the committed row while the update is open.
+        cache.put(make_category('food', 1))
+
+    assert categories.get(1).category_name == 'groceries'
+
+
+@pytest.mark.parametrize('category_cache', [None, CategoryCache()])
+def test_get_returns_the_same_expense_with_and_without_cache(seeded, category_cache):
+    expenses = ExpenseRepositoryImplementation(pool=seeded, category_cache=category_cache)
+
+    expense = expenses.get(1)
+    assert (expense.expense_name, expense.user_id, expense.category_name) == ('lunch', 1, 'food')
+    assert expenses.get(3) is None
+    assert [expense.expense_name for expense in expenses.get_by(month_year='2024-02')] == ['dinner']
+
+
+@pytest.mark.parametrize('category_cache', [None, CategoryCache()])
+def test_expenses_without_a_category_are_skipped(seeded, category_cache):
+    with seeded.connection() as connection, connection.cursor() as cursor:
+        cursor.execute('PRAGMA foreign_keys=OFF')
+        cursor.execute('DELETE FROM `expense_categories`')
+        cursor.execute('PRAGMA foreign_keys=ON')
+    expenses = ExpenseRepositoryImplementation(pool=seeded, category_cache=category_cache)
+
+    assert expenses.get(1) is None
+    assert expenses.get_all() is None
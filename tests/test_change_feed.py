@@ -0,0 +1,56 @@
+from conftest import make_chat
+from conftest import make_expense
+from expenses_persistence import CategoryCache
+from expenses_persistence import ExpenseRepositoryImplementation
+
+import pytest
+
+
+def test_changes_since_resumes_from_the_watermark(chats):
+    chats.add_batch([make_chat(1, f'm{i}') for i in range(5)])
+
+    batch = chats.changes_since(limit=3, lag=0)
+    assert [chat.content for chat in batch.items] == ['m0', 'm1', 'm2']
+    assert batch.has_more
+
+    rest = chats.changes_since(batch.watermark, limit=3, lag=0)
+    assert [chat.content for chat in rest.items] == ['m3', 'm4']
+    assert not rest.has_more
+
+    empty = chats.changes_since(rest.watermark, lag=0)
+    assert empty.items == []
+    assert empty.watermark == rest.watermark
+
+
+def test_changes_since_holds_back_recent_rows(pool, chats):
+    chats.add_batch([make_chat(1, f'm{i}') for i in range(4)])
+    with pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("UPDATE `chats` SET `updated_at` = datetime('now', '-1 minute') WHERE `chat_id` <= 2")
+
+    batch = chats.changes_since(lag=30)
+    assert [chat.chat_id for chat in batch.items] == [1, 2]
+    assert [chat.chat_id for chat in chats.changes_since(batch.watermark, lag=0).items] == [3, 4]
+    with pytest.raises(ValueError):
+        chats.changes_since(lag=-1)
+
+
+@pytest.mark.parametrize('category_cache', [None, CategoryCache()])
+def test_expense_feed_moves_past_orphaned_expenses(categorised, category_cache):
+    with categorised.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("INSERT INTO `expense_categories` (`category_name`) VALUES ('rent')")
+    expenses = ExpenseRepositoryImplementation(pool=categorised, category_cache=category_cache)
+    expenses.add_batch([make_expense(f'orphan{index}', category_id=2) for index in range(3)]
+                       + [make_expense(f'kept{index}') for index in range(2)])
+    with categorised.connection() as connection, connection.cursor() as cursor:
+        cursor.execute('PRAGMA foreign_keys=OFF')
+        cursor.execute('DELETE FROM `expense_categories` WHERE `exp_category_id` = 2')
+        cursor.execute('PRAGMA foreign_keys=ON')
+
+    seen = []
+    watermark = None
+    for _ in range(3):
+        batch = expenses.changes_since(watermark, limit=2, lag=0)
+        seen += [expense.expense_name for expense in batch.items]
+        watermark = batch.watermark
+    assert seen == ['kept0', 'kept1']
+    assert all(expense.category_name == 'food' for expense in batch.items)
@@ -0,0 +1,117 @@
+from conftest import make_chat
+from expenses_persistence import ChatHistoryRepositoryImplementation
+from expenses_persistence import ChatTailCache
+from expenses_persistence import UnitOfWork
+
+import pytest
+
+
+@pytest.fixture
+def cache():
+    return ChatTailCache(size=5)
+
+
+@pytest.fixture
+def cached_chats(pool, cache):
+    repository = ChatHistoryRepositoryImplementation(pool=pool, tail_cache=cache)
+    yield repository
+    repository.close()
+
+
+def contents(chats) -> list[str]:
+    return [chat.content for chat in chats]
+
+
+def test_get_recent_returns_newest_in_chronological_order(chats):
+    chats.add_batch([make_chat(1, f'm{i}') for i in range(6)] + [make_chat(2, 'other')])
+
+    assert contents(chats.get_recent(1, limit=3)) == ['m3', 'm4', 'm5']
+    assert contents(chats.get_recent(1, limit=10)) == [f'm{i}' for i in range(6)]
+    assert chats.get_recent(1, limit=0) == []
+    assert chats.get_recent(3) == []
+
+
+def test_get_recent_within_a_budget(chats):
+    chats.add_batch([make_chat(1, content) for content in ('aaaa', 'bb', 'cc', 'd')])
+
+    assert contents(chats.get_recent(1, budget=5)) == ['bb', 'cc', 'd']
+    assert contents(chats.get_recent(1, budget=1)) == ['d']
+    assert chats.get_recent(1, budget=0) == []
+
+
+def test_cached_tail_matches_the_database(chats, cached_chats):
+    cached_chats.add_batch([make_chat(1, f'm{i}') for i in range(3)])
+
+    assert contents(cached_chats.get_recent(1, limit=5)) == ['m0', 'm1', 'm2']
+    assert contents(cached_chats.get_recent(1, limit=2)) == ['m1', 'm2']
+    assert contents(cached_chats.get_recent(1, limit=0)) == []
+
+    for index in range(3, 7):
+        cached_chats.add(make_chat(1, f'm{index}'))
+    assert contents(cached_chats.get_recent(1, limit=3)) == ['m4', 'm5', 'm6']
+    assert contents(cached_chats.get_recent(1, limit=5)) == contents(chats.get_recent(1, limit=5))
+    assert cached_chats.get_recent(1, limit=5)[-1].created_at is not None
+
+
+def test_adds_keep_the_tail_warm(pool, cached_chats):
+    cached_chats.add(make_chat(1, 'hello'))
+    cached_chats.get_recent(1, limit=5)
+
+    cached_chats.add(make_chat(1, 'again'))
+    checkouts = pool.stats().checkouts
+    assert contents(cached_chats.get_recent(1, limit=5)) == ['hello', 'again']
+    assert pool.stats().checkouts == checkouts
+
+
+def test_rolled_back_chats_never_reach_the_tail_cache(pool, cached_chats):
+    cached_chats.add(make_chat(1, 'kept'))
+    assert contents(cached_chats.get_recent(1, limit=5)) == ['kept']
+
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(pool):
+            cached_chats.add(make_chat(1, 'phantom'))
+            assert contents(cached_chats.get_recent(1, limit=5)) == ['kept', 'phantom']
+            raise RuntimeError('abort')
+
+    assert contents(cached_chats.get_recent(1, limit=5)) == ['kept']
+
+    with UnitOfWork(pool):
+        cached_chats.add(make_chat(1, 'committed'))
+    assert contents(cached_chats.get_recent(1, limit=5)) == ['kept', 'committed']
+
+
+def test_a_read_that_races_a_write_is_not_cached(pool, cache, cached_chats):
+    writer = ChatHistoryRepositoryImplementation(pool=pool, tail_cache=cache)
+    cached_chats.add(make_chat(1, 'before'))
+    read = cached_chats._fetch_recent
+
+    def racing_read(user_id, limit):
+        chats = read(user_id, limit)
+        writer.add(make_chat(1, 'during'))
+        return chats
+
+    cached_chats._fetch_recent = racing_read
+    assert contents(cached_chats.get_recent(1, limit=5)) == ['before']
+    cached_chats._fetch_recent = read
+    assert contents(cached_chats.get_recent(1, limit=5)) == ['before', 'during']
+
+
+def test_tail_cache_refuses_stale_loads():
+    cache = ChatTailCache(size=2, max_users=1)
+    generation = cache.generation()
+    cache.invalidate(1)
+    assert not cache.load(1, [make_chat(1, 'stale')], True, generation)
+    assert cache.load(2, [make_chat(2, 'fresh')], True, generation)
+
+    # Forgetting user 2's change to stay within max_users refuses every
+    # load that started before it.
+    generation = cache.generation()
+    cache.append(2, [])
+    cache.append(3, [])
+    assert not cache.load(2, [], True, generation)
+    assert cache.load(2, [], True, cache.generation())
+
+    generation = cache.generation()
+    cache.invalidate()
+    assert not cache.load(4, [], True, generation)
+    assert cache.get(2, 1) is None
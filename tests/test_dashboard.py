@@ -0,0 +1,67 @@
+from conftest import make_chat
+from conftest import make_expense
+from expenses_persistence import CategoryCache
+from expenses_persistence import ChatHistoryRepositoryImplementation
+from expenses_persistence import DashboardLoader
+from expenses_persistence import ExpenseRepositoryImplementation
+from expenses_persistence import Instrumentation
+from expenses_persistence import UnitOfWork
+
+import pytest
+
+
+@pytest.fixture
+def seeded(categorised):
+    expenses = ExpenseRepositoryImplementation(pool=categorised)
+    expenses.add_batch([make_expense('lunch'), make_expense('rent', month_year='2024-02'),
+                        make_expense('dinner')])
+    chats = ChatHistoryRepositoryImplementation(pool=categorised)
+    chats.add_batch([make_chat(1, f'm{index}') for index in range(4)])
+    return categorised
+
+
+def test_load_reads_everything_with_one_checkout(seeded):
+    instrumentation = Instrumentation()
+    loader = DashboardLoader(seeded, instrumentation=instrumentation, chat_limit=3)
+    checkouts = seeded.stats().checkouts
+
+    dashboard = loader.load(1, '2024-01')
+    assert seeded.stats().checkouts - checkouts == 1
+    assert dashboard.user.username == 'user'
+    assert [expense.expense_name for expense in dashboard.expenses] == ['lunch', 'dinner']
+    assert [category.category_name for category in dashboard.categories] == ['food']
+    assert [chat.content for chat in dashboard.chats] == ['m1', 'm2', 'm3']
+    assert instrumentation.snapshot()['DashboardLoader.load']['count'] == 1
+
+
+def test_unknown_user_gets_an_empty_dashboard(seeded):
+    dashboard = DashboardLoader(seeded).load(2, '2024-01')
+    assert (dashboard.user, dashboard.expenses, dashboard.chats) == (None, [], [])
+
+
+def test_categories_come_from_the_cache(seeded):
+    cache = CategoryCache()
+    loader = DashboardLoader(seeded, category_cache=cache)
+
+    assert [category.category_name for category in loader.load(1, '2024-01').categories] == ['food']
+    assert [category.category_name for category in loader.load(1, '2024-02').categories] == ['food']
+    assert cache.hits == 1
+
+
+def test_uncommitted_categories_stay_out_of_the_cache(seeded):
+    cache = CategoryCache()
+    loader = DashboardLoader(seeded, category_cache=cache)
+
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(seeded) as unit, unit.connection.cursor() as cursor:
+            cursor.execute("INSERT INTO `expense_categories` (`category_name`) VALUES ('phantom')")
+            assert len(loader.load(1, '2024-01').categories) == 2
+            raise RuntimeError('abort')
+
+    assert cache.get_all() is None
+    assert len(loader.load(1, '2024-01').categories) == 1
+
+
+def test_negative_chat_limit_is_rejected(pool):
+    with pytest.raises(ValueError):
+        DashboardLoader(pool, chat_limit=-1)
@@ -0,0 +1,48 @@
+from conftest import make_expense
+from expenses_persistence import ExpenseRepositoryImplementation
+
+import pytest
+
+
+@pytest.fixture
+def expenses(categorised):
+    repository = ExpenseRepositoryImplementation(pool=categorised)
+    yield repository
+    repository.close()
+
+
+def names(expenses) -> list[str]:
+    return [expense.expense_name for expense in expenses]
+
+
+def test_add_batch_returns_the_ids_in_order(expenses):
+    first = expenses.add(make_expense('single'))
+    ids = expenses.add_batch([make_expense(f'e{index}') for index in range(5)], chunk_size=2)
+
+    assert ids == list(range(first + 1, first + 6))
+    assert [expenses.get(id).expense_name for id in ids] == [f'e{index}' for index in range(5)]
+    assert expenses.add_batch([]) == []
+
+
+def test_update_batch(expenses):
+    ids = expenses.add_batch([make_expense(f'e{index}') for index in range(3)])
+
+    updated = expenses.update_batch({ids[0]: make_expense('first', amount=1),
+                                     ids[2]: make_expense('third', month_year='2024-03')}, chunk_size=1)
+    assert updated == 2
+    assert names(expenses.get_all()) == ['first', 'e1', 'third']
+    assert expenses.get(ids[2]).month_year == '2024-03'
+    assert expenses.update_batch({99: make_expense('missing')}) == 0
+
+
+def test_upsert_batch_inserts_and_updates(expenses):
+    id = expenses.add(make_expense('old'))
+
+    expenses.upsert_batch([make_expense('new', id=id), make_expense('added', id=id + 1)], chunk_size=1)
+    assert names(expenses.get_all()) == ['new', 'added']
+
+
+def test_a_failing_chunk_rolls_back_the_whole_batch(expenses):
+    with pytest.raises(Exception):
+        expenses.add_batch([make_expense('ok'), make_expense(None)], chunk_size=1)
+    assert expenses.get_all() is None
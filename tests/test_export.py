@@ -0,0 +1,58 @@
+from conftest import make_expense
+from expenses_persistence import ExpenseRepositoryImplementation
+
+import csv
+import io
+import pytest
+
+
+@pytest.fixture
+def expenses(categorised):
+    repository = ExpenseRepositoryImplementation(pool=categorised)
+    repository.add_batch([make_expense(f'e{index}', amount=index, month_year=f'2024-0{1 + index % 2}')
+                          for index in range(5)])
+    yield repository
+    repository.close()
+
+
+def test_csv_export_walks_every_chunk(expenses, tmp_path):
+    path = tmp_path / 'expenses.csv'
+    assert expenses.export(path, chunk_size=2) == 5
+
+    with open(path, newline='') as stream:
+        rows = list(csv.DictReader(stream))
+    assert [row['expense_name'] for row in rows] == [f'e{index}' for index in range(5)]
+    assert rows[0]['category_name'] == 'food'
+    assert float(rows[4]['expense_amount']) == 4
+
+
+def test_csv_export_to_a_stream_with_filters(expenses):
+    stream = io.StringIO()
+    assert expenses.export(stream, chunk_size=1, month_year='2024-02') == 2
+
+    rows = list(csv.reader(io.StringIO(stream.getvalue())))
+    assert rows[0][:2] == ['expense_id', 'expense_name']
+    assert [row[1] for row in rows[1:]] == ['e1', 'e3']
+    assert not stream.closed
+
+
+def test_empty_export_writes_the_header(expenses):
+    stream = io.StringIO()
+    assert expenses.export(stream, user_id=2) == 0
+    assert stream.getvalue().startswith('expense_id,expense_name,')
+
+
+def test_export_rejects_bad_arguments(expenses):
+    with pytest.raises(ValueError):
+        expenses.export(io.StringIO(), format='xlsx')
+    with pytest.raises(ValueError):
+        expenses.export(io.StringIO(), chunk_size=0)
+
+
+def test_parquet_export(expenses, tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    path = tmp_path / 'expenses.parquet'
+    assert expenses.export(path, format='parquet', chunk_size=2) == 5
+
+    table = parquet.read_table(path)
+    assert table.column('expense_name').to_pylist() == [f'e{index}' for index in range(5)]
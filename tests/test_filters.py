@@ -0,0 +1,81 @@
+from conftest import make_chat
+from expenses_persistence.filters import FilterBuilder
+
+import pytest
+
+builder = FilterBuilder({
+    'user_id': '`user_id`',
+    'content': '`content`',
+    'created_at': '`created_at`'
+})
+
+
+def test_empty_filter_adds_nothing():
+    filters = builder.build({})
+    assert filters.sql == ''
+    assert filters.params == ()
+
+
+def test_equality_conditions_are_parameterised():
+    filters = builder.build({'user_id': 1, 'content': 'hi'})
+    assert filters.where == ' WHERE `user_id` = %s AND `content` = %s'
+    assert filters.params == (1, 'hi')
+
+
+def test_operators():
+    filters = builder.build({'user_id__in': [1, 2], 'created_at__gte': '2024-01-01', 'content__isnull': False})
+    assert filters.where == ' WHERE `user_id` IN (%s, %s) AND `created_at` >= %s AND `content` IS NOT NULL'
+    assert filters.params == (1, 2, '2024-01-01')
+
+
+def test_none_means_is_null():
+    filters = builder.build({'content': None})
+    assert filters.where == ' WHERE `content` IS NULL'
+    assert filters.params == ()
+
+
+def test_empty_in_matches_nothing():
+    assert builder.build({'user_id__in': []}).where == ' WHERE 1 = 0'
+    assert builder.build({'user_id__not_in': []}).where == ' WHERE 1 = 1'
+
+
+def test_order_by_and_limit():
+    filters = builder.build({'user_id': 1, 'order_by': ['-created_at', 'user_id'], 'limit': '5'})
+    assert filters.sql == ' WHERE `user_id` = %s ORDER BY `created_at` DESC, `user_id` ASC LIMIT %s'
+    assert filters.params == (1, 5)
+
+
+def test_unknown_column_is_rejected():
+    with pytest.raises(ValueError, match='Unknown column'):
+        builder.build({'user_id = 1 OR 1': 1})
+    with pytest.raises(ValueError, match='Unknown column'):
+        builder.build({'order_by': '-password'})
+
+
+def test_unknown_operator_is_rejected():
+    with pytest.raises(ValueError, match='Unknown filter operator'):
+        builder.build({'user_id__like': 1})
+
+
+def test_ordering_can_be_disallowed():
+    with pytest.raises(ValueError):
+        builder.build({'order_by': 'user_id'}, ordering=False)
+    with pytest.raises(ValueError):
+        builder.build({'limit': 1}, ordering=False)
+
+
+def test_references():
+    assert builder.references({'content__isnull': True}, 'content')
+    assert builder.references({'order_by': '-content'}, 'content')
+    assert not builder.references({'user_id': 1, 'limit': 3}, 'content')
+
+
+
+def test_repository_get_by_with_operators(chats):
+    chats.add_batch([make_chat(1 + index % 2, f'm{index}') for index in range(5)])
+
+    assert [chat.content for chat in chats.get_by(user_id=1, chat_id__gt=1, order_by='-chat_id')] == ['m4', 'm2']
+    assert [chat.content for chat in chats.get_by(chat_id__in=[2, 4], limit=1)] == ['m1']
+    assert chats.get_by(chat_id__in=[]) is None
+    with pytest.raises(ValueError, match='Unknown column'):
+        chats.get_by(**{'user_id = 1 OR chat_id': 1})
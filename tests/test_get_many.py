@@ -0,0 +1,46 @@
+from conftest import make_chat
+from conftest import make_expense
+from expenses_persistence import CategoryCache
+from expenses_persistence import ExpenseCategoriesRepositoryImplementation
+from expenses_persistence import ExpenseRepositoryImplementation
+from expenses_persistence import UserRepositoryImplementation
+
+import pytest
+
+
+def test_chats_are_fetched_in_chunks(pool, chats):
+    chats.add_batch([make_chat(1, f'm{index}') for index in range(5)])
+    checkouts = pool.stats().checkouts
+
+    found = chats.get_many([5, 1, 3, 1, 42], chunk_size=2)
+    assert {id: chat.content for id, chat in found.items()} == {5: 'm4', 1: 'm0', 3: 'm2'}
+    assert pool.stats().checkouts - checkouts == 2
+    assert chats.get_many([]) == {}
+
+
+@pytest.mark.parametrize('category_cache', [None, CategoryCache()])
+def test_expenses_and_users(categorised, category_cache):
+    expenses = ExpenseRepositoryImplementation(pool=categorised, category_cache=category_cache)
+    ids = expenses.add_batch([make_expense(f'e{index}') for index in range(3)])
+
+    found = expenses.get_many(ids + [99])
+    assert sorted(found) == ids
+    assert [(found[id].expense_name, found[id].category_name) for id in ids] == [('e0', 'food'), ('e1', 'food'),
+                                                                                  ('e2', 'food')]
+    users = UserRepositoryImplementation(pool=categorised).get_many([1, 2])
+    assert [user.username for user in users.values()] == ['user']
+
+
+def test_categories_only_query_what_the_cache_misses(categorised):
+    cache = CategoryCache()
+    categories = ExpenseCategoriesRepositoryImplementation(pool=categorised, cache=cache)
+    with categorised.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("INSERT INTO `expense_categories` (`category_name`) VALUES ('rent')")
+
+    assert categories.get(1).category_name == 'food'
+    checkouts = categorised.stats().checkouts
+    assert {id: category.category_name for id, category in categories.get_many([1, 2]).items()} == {1: 'food',
+                                                                                                  2: 'rent'}
+    assert categorised.stats().checkouts - checkouts == 1
+    assert set(categories.get_many([1, 2])) == {1, 2}
+    assert categorised.stats().checkouts - checkouts == 1
@@ -0,0 +1,73 @@
+from conftest import make_chat
+from expenses_persistence import ChatHistoryRepositoryImplementation
+from expenses_persistence import Instrumentation
+from expenses_persistence.instrumentation import LatencyHistogram
+
+import logging
+import pytest
+
+
+@pytest.fixture
+def instrumentation():
+    return Instrumentation(slow_query_threshold=0)
+
+
+@pytest.fixture
+def instrumented_chats(pool, instrumentation):
+    repository = ChatHistoryRepositoryImplementation(pool=pool, instrumentation=instrumentation)
+    yield repository
+    repository.close()
+
+
+def test_hooks_see_each_public_call(instrumentation, instrumented_chats):
+    events = []
+    instrumentation.add_hook(events.append)
+
+    instrumented_chats.add_batch([make_chat(1, f'm{i}') for i in range(3)])
+    instrumented_chats.get_by(user_id=1)
+    assert len(list(instrumented_chats.iter_all(chunk_size=2))) == 3
+
+    assert [(event.repository, event.operation, event.rows) for event in events] == [
+        ('ChatHistoryRepositoryImplementation', 'add_batch', 3),
+        ('ChatHistoryRepositoryImplementation', 'get_by', 3),
+        ('ChatHistoryRepositoryImplementation', 'iter_all', 3)]
+    assert all(event.error is None and event.total >= event.execute > 0 for event in events)
+
+    instrumentation.remove_hook(events.append)
+    instrumented_chats.get(1)
+    assert len(events) == 3
+    assert instrumentation.snapshot()['ChatHistoryRepositoryImplementation.get']['count'] == 1
+
+
+def test_failed_queries_are_recorded(instrumentation, instrumented_chats):
+    events = []
+    instrumentation.add_hook(events.append)
+
+    with pytest.raises(Exception):
+        instrumented_chats.add(make_chat(1, None))
+    assert events[0].operation == 'add' and events[0].error is not None
+
+
+def test_a_failing_hook_is_logged_not_raised(instrumentation, instrumented_chats, caplog):
+    def broken(event):
+        raise RuntimeError('hook failed')
+
+    instrumentation.add_hook(broken)
+    with caplog.at_level(logging.WARNING, logger='expenses_persistence.slow_query'):
+        chat_id = instrumented_chats.add(make_chat(1, 'kept'))
+
+    assert instrumented_chats.get(chat_id).content == 'kept'
+    assert 'Slow query in ChatHistoryRepositoryImplementation.add' in caplog.text
+    assert 'Instrumentation hook' in caplog.text and 'hook failed' in caplog.text
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    assert histogram.snapshot()['p50'] == 0.0
+    for value in [0.001] * 90 + [0.5] * 10:
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 100 and snapshot['max'] == 0.5
+    assert 0.001 <= snapshot['p50'] < 0.0015
+    assert 0.5 <= snapshot['p99'] * 1.5 and snapshot['p99'] <= 0.5
@@ -0,0 +1,54 @@
+from array import array
+from collections import namedtuple
+from conftest import make_expense
+from decimal import Decimal
+from expenses_persistence import ExpenseRepositoryImplementation
+from expenses_persistence.mappers import row_mapper
+from expenses_persistence.mappers import to_columns
+
+import pytest
+
+Row = namedtuple('Row', ['a', 'b'])
+
+
+def test_row_mapper_is_compiled_once_per_shape():
+    mapper = row_mapper(Row, ('a', 'b'))
+    assert mapper((1, 2)) == Row(a=1, b=2)
+    assert row_mapper(Row, ('a', 'b')) is mapper
+    assert row_mapper(Row, ('b', 'a'))((1, 2)) == Row(a=2, b=1)
+
+
+def test_row_mapper_falls_back_for_non_identifier_columns():
+    assert row_mapper(dict, ('a b', 'c'))((1, 2)) == {'a b': 1, 'c': 2}
+
+
+def test_to_columns_packs_numbers():
+    columns = to_columns(('id', 'amount', 'name', 'flag'),
+                         [(1, Decimal('1.5'), 'x', True), (2, 3, 'y', False)])
+
+    assert columns['id'] == array('q', [1, 2])
+    assert columns['amount'] == array('d', [1.5, 3.0])
+    assert columns['name'] == ['x', 'y']
+    assert columns['flag'] == [True, False]
+    assert to_columns(('id',), []) == {'id': []}
+
+
+def test_get_columns_matches_the_entities(categorised):
+    expenses = ExpenseRepositoryImplementation(pool=categorised)
+    expenses.add_batch([make_expense('lunch', amount=12.5), make_expense('dinner', amount=20, month_year='2024-02')])
+
+    columns = expenses.get_columns(user_id=1)
+    assert columns['expense_id'] == array('q', [1, 2])
+    assert columns['expense_amount'] == array('d', [12.5, 20.0])
+    assert columns['category_name'] == ['food', 'food']
+    assert list(expenses.get_columns(month_year='2024-02')['expense_name']) == ['dinner']
+
+
+def test_get_columns_with_numpy(categorised):
+    numpy = pytest.importorskip('numpy')
+    expenses = ExpenseRepositoryImplementation(pool=categorised)
+    expenses.add(make_expense('lunch', amount=12.5))
+
+    amounts = expenses.get_columns(use_numpy=True)['expense_amount']
+    assert amounts.dtype == numpy.float64
+    assert amounts.tolist() == [12.5]
@@ -0,0 +1,74 @@
+from conftest import make_chat
+from datetime import datetime
+from expenses_persistence import ExpenseRepositoryImplementation
+from expenses_persistence import InvalidPageToken
+from expenses_persistence.pagination import BACKWARD
+from expenses_persistence.pagination import decode_token
+from expenses_persistence.pagination import encode_token
+
+import pytest
+
+
+@pytest.mark.parametrize('sort_value', ['2024-01-01 10:00:00', 12, 1.5, None, datetime(2024, 1, 1, 10, 30)])
+def test_token_round_trip(sort_value):
+    assert decode_token(encode_token(sort_value, 7)) == (sort_value, 7)
+
+
+def test_token_is_url_safe():
+    token = encode_token('a/b+c?', 1)
+    assert token.replace('-', '').replace('_', '').isalnum()
+
+
+@pytest.mark.parametrize('token', ['', 'not a token', encode_token('x', 1)[:-3], 'W1sxXV0', 'eyJhIjoxfQ'])
+def test_malformed_token(token):
+    with pytest.raises(InvalidPageToken):
+        decode_token(token)
+
+
+def test_malformed_datetime_token():
+    with pytest.raises(InvalidPageToken):
+        decode_token(encode_token({'dt': 'yesterday'}, 1))
+
+
+def test_page_by_walks_forward_and_back(chats):
+    chats.add_batch([make_chat(1, f'm{i}') for i in range(7)] + [make_chat(2, 'other')])
+
+    page = chats.page_by(page_size=3, user_id=1)
+    assert page.previous_token is None
+    seen = [chat.content for chat in page.items]
+    while page.next_token is not None:
+        page = chats.page_by(page_size=3, token=page.next_token, user_id=1)
+        seen += [chat.content for chat in page.items]
+    assert seen == [f'm{i}' for i in range(7)]
+
+    previous = chats.page_by(page_size=3, token=page.previous_token, direction=BACKWARD, user_id=1)
+    assert [chat.content for chat in previous.items] == ['m3', 'm4', 'm5']
+    assert previous.next_token is not None
+
+
+def test_page_by_rejects_bad_arguments(chats):
+    with pytest.raises(ValueError):
+        chats.page_by(page_size=0)
+    with pytest.raises(ValueError):
+        chats.page_by(direction='sideways')
+    with pytest.raises(InvalidPageToken):
+        chats.page_by(token='garbage')
+
+
+def test_expense_page_by_orders_ties_by_id(pool):
+    with pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("INSERT INTO `expense_categories` (`category_name`) VALUES ('food')")
+        cursor.execute('''
+            INSERT INTO `expenses` (`expense_name`, `expense_amount`, `month_year`, `user_id`, `exp_category_id`,
+                                    `created_at`)
+            VALUES ('a', 1, '2024-01', 1, 1, '2024-01-02 00:00:00'), ('b', 1, '2024-01', 1, 1, '2024-01-01 00:00:00'),
+                   ('c', 1, '2024-01', 1, 1, '2024-01-02 00:00:00'), ('d', 1, '2024-01', 2, 1, '2024-01-01 00:00:00')
+            ''')
+    expenses = ExpenseRepositoryImplementation(pool=pool)
+
+    first = expenses.page_by(page_size=2, user_id=1)
+    assert [expense.expense_name for expense in first.items] == ['b', 'a']
+    second = expenses.page_by(page_size=2, token=first.next_token, user_id=1)
+    assert [expense.expense_name for expense in second.items] == ['c']
+    assert second.next_token is None
+    assert expenses.page_by(user_id=3).items == []
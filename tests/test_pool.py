@@ -0,0 +1,89 @@
+from expenses_persistence import ChatHistoryRepositoryImplementation
+from expenses_persistence import ConnectionPool
+from expenses_persistence import PoolError
+from expenses_persistence import PoolTimeoutError
+from expenses_persistence import SQLiteBackend
+from expenses_persistence import UserRepositoryImplementation
+
+import pytest
+import threading
+
+
+def test_connections_are_reused(pool):
+    checkouts = pool.stats().checkouts
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+
+    stats = pool.stats()
+    assert stats.checkouts == checkouts + 2
+    assert stats.in_use == 0
+    assert stats.size == stats.idle == 1
+
+
+def test_invalid_sizes(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'sizes.db'))
+    with pytest.raises(ValueError):
+        ConnectionPool(backend=backend, max_size=0)
+    with pytest.raises(ValueError):
+        ConnectionPool(backend=backend, min_size=3, max_size=2)
+
+
+def test_timeout_while_another_thread_holds_every_connection(tmp_path):
+    pool = ConnectionPool(backend=SQLiteBackend(str(tmp_path / 'busy.db')), max_size=1)
+    held = threading.Event()
+    done = threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.set()
+            done.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    try:
+        held.wait(5)
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire(timeout=0.05)
+        assert pool.stats().timeouts == 1
+    finally:
+        done.set()
+        holder.join()
+
+    with pool.connection():
+        pass
+
+
+def test_closed_pool_refuses_checkouts(pool):
+    pool.close()
+    with pytest.raises(PoolError):
+        pool.acquire()
+
+
+def test_idle_connections_beyond_min_size_expire(tmp_path):
+    pool = ConnectionPool(backend=SQLiteBackend(str(tmp_path / 'idle.db')), min_size=1, max_size=2, max_idle=0)
+    with pool.connection(), pool.connection():
+        pass
+    assert pool.stats().size == 2
+
+    with pool.connection():
+        pass
+    stats = pool.stats()
+    assert stats.size == 1
+    assert stats.closed >= 1
+
+
+def test_pool_is_shared_between_repositories(pool):
+    chats = ChatHistoryRepositoryImplementation(pool=pool)
+    users = UserRepositoryImplementation(pool=pool)
+    chats.get_all()
+    users.get_all()
+    chats.close()
+    users.close()
+
+    # Repositories never close a pool they were given.
+    with pool.connection():
+        pass
+    assert pool.stats().created == 1
@@ -0,0 +1,56 @@
+from conftest import make_chat
+from conftest import make_expense
+from expenses_persistence import CategoryCache
+from expenses_persistence import ExpenseRepositoryImplementation
+from expenses_persistence import UserRepositoryImplementation
+from expenses_persistence.filters import FilterBuilder
+
+import pytest
+
+
+def test_select_aliases_whitelisted_columns():
+    builder = FilterBuilder({'user_id': '`user_id`', 'content': '`content`'})
+    assert builder.select(['user_id', 'content']) == '`user_id` AS `user_id`,\n            `content` AS `content`'
+    with pytest.raises(ValueError):
+        builder.select([])
+    with pytest.raises(ValueError):
+        builder.select(['user_id', 'user_id'])
+    with pytest.raises(ValueError, match='Unknown column'):
+        builder.select(['password'])
+
+
+def test_fields_return_named_tuples(chats):
+    chats.add_batch([make_chat(1, 'hello'), make_chat(2, 'other')])
+
+    chat = chats.get(1, fields=('chat_id', 'role_id'))
+    assert chat == (1, 1) and chat._fields == ('chat_id', 'role_id')
+    assert chats.get(3, fields='chat_id') is None
+    assert [row.chat_id for row in chats.get_by(fields='chat_id', user_id=2)] == [2]
+    assert [tuple(row) for row in chats.get_all(fields=['user_id'])] == [(1,), (2,)]
+    assert chats.get_by(fields='chat_id', user_id=3) is None
+
+
+def test_user_fields_skip_the_password(categorised):
+    users = UserRepositoryImplementation(pool=categorised)
+    assert users.get(1, fields=('user_id', 'username')) == (1, 'user')
+    with pytest.raises(ValueError):
+        users.get_all(fields=('user_id', 'secret'))
+
+
+@pytest.mark.parametrize('category_cache', [None, CategoryCache()])
+def test_expense_fields_skip_orphans_like_full_reads(categorised, category_cache):
+    expenses = ExpenseRepositoryImplementation(pool=categorised, category_cache=category_cache)
+    expenses.add_batch([make_expense('lunch'), make_expense('dinner')])
+    assert [row.category_name for row in expenses.get_all(fields=('expense_id', 'category_name'))] == ['food', 'food']
+
+    with categorised.connection() as connection, connection.cursor() as cursor:
+        cursor.execute('PRAGMA foreign_keys=OFF')
+        cursor.execute('DELETE FROM `expense_categories`')
+        cursor.execute('PRAGMA foreign_keys=ON')
+    if category_cache is not None:
+        category_cache.invalidate()
+
+    assert expenses.get_all() is None
+    assert expenses.get_all(fields='expense_name') is None
+    assert expenses.get_by(fields=('expense_id',), user_id=1) is None
+    assert expenses.get(1, fields='expense_amount') is None
@@ -0,0 +1,128 @@
+from conftest import make_chat
+from expenses_persistence import ChatHistoryRepositoryImplementation
+from expenses_persistence import ConnectionPool
+from expenses_persistence import SQLiteBackend
+from expenses_persistence import UnitOfWork
+from expenses_persistence import create_schema
+from expenses_persistence.backends import SQLiteConnection
+from expenses_persistence.backends import SQLiteCursor
+
+import pytest
+
+
+class LostConnection(Exception):
+    pass
+
+
+class FlakyCursor(SQLiteCursor):
+    def __init__(self, cursor, connection):
+        super().__init__(cursor)
+        self._flaky = connection
+
+    def execute(self, query, args=None):
+        if self._flaky.backend.failures:
+            self._flaky.backend.failures -= 1
+            self._flaky.lost = True
+            raise LostConnection(query)
+        return super().execute(query, args)
+
+
+class FlakyConnection(SQLiteConnection):
+    # Once a statement fails, the connection behaves like one the server
+    # dropped: rollback and ping fail too.
+    def __init__(self, connection, backend):
+        super().__init__(connection._connection)
+        self.backend = backend
+        self.lost = False
+
+    def cursor(self, cursor_type=None):
+        return FlakyCursor(self._connection.cursor(), self)
+
+    def rollback(self):
+        if self.lost:
+            raise LostConnection('rollback')
+        super().rollback()
+
+    def ping(self, reconnect=False):
+        if self.lost:
+            raise LostConnection('ping')
+        super().ping(reconnect)
+
+
+class FlakyBackend(SQLiteBackend):
+    def __init__(self, path):
+        super().__init__(path)
+        self.failures = 0
+
+    def connect(self):
+        return FlakyConnection(super().connect(), self)
+
+    def is_disconnect(self, error):
+        return isinstance(error, LostConnection)
+
+
+@pytest.fixture
+def flaky(tmp_path):
+    backend = FlakyBackend(str(tmp_path / 'flaky.db'))
+    pool = ConnectionPool(backend=backend, max_size=2)
+    create_schema(pool)
+    chats = ChatHistoryRepositoryImplementation(pool=pool)
+    chats.add(make_chat(1, 'hello'))
+    yield backend, pool, chats
+    pool.close()
+
+
+def test_lazy_pool_connects_on_first_checkout(tmp_path):
+    pool = ConnectionPool(backend=SQLiteBackend(str(tmp_path / 'lazy.db')), lazy=True)
+    assert pool.stats().created == 0
+    with pool.connection():
+        pass
+    assert pool.stats().created == 1
+
+
+def test_repository_never_connects_until_used():
+    chats = ChatHistoryRepositoryImplementation(host='db.invalid', user='user', password='secret',
+                                               db_name='expenses', db_port=3306)
+    assert chats._pool.stats().created == 0
+    chats.close()
+    chats.close()
+
+
+def test_reads_retry_on_a_fresh_connection(flaky):
+    backend, pool, chats = flaky
+    closed = pool.stats().closed
+
+    backend.failures = 2
+    assert chats.get(1).content == 'hello'
+    assert pool.stats().closed - closed == 2
+
+    backend.failures = 3
+    with pytest.raises(LostConnection):
+        chats.get_by(user_id=1)
+    assert backend.failures == 0
+
+
+def test_writes_and_units_of_work_are_not_retried(flaky):
+    backend, pool, chats = flaky
+
+    backend.failures = 1
+    with pytest.raises(LostConnection):
+        chats.add(make_chat(1, 'maybe written'))
+
+    backend.failures = 1
+    with pytest.raises(LostConnection):
+        with UnitOfWork(pool):
+            chats.get(1)
+    assert [chat.content for chat in chats.get_all()] == ['hello']
+
+
+def test_dead_idle_connections_are_replaced_on_checkout(tmp_path):
+    backend = FlakyBackend(str(tmp_path / 'idle.db'))
+    pool = ConnectionPool(backend=backend, health_check_after=0)
+    with pool.connection() as connection:
+        connection.lost = True
+
+    with pool.connection() as connection:
+        assert not connection.lost
+    stats = pool.stats()
+    assert (stats.failed_health_checks, stats.created) == (1, 2)
@@ -0,0 +1,63 @@
+from conftest import make_chat
+from expenses_persistence import ChatHistoryRepositoryImplementation
+from expenses_persistence import ConnectionPool
+from expenses_persistence import ReplicaRouter
+from expenses_persistence import SQLiteBackend
+from expenses_persistence import UnitOfWork
+from expenses_persistence import create_schema
+
+import pytest
+
+
+@pytest.fixture
+def replica(tmp_path):
+    # A separate database that never receives the primary's writes, so it
+    # plays a replica that lags forever.
+    replica = ConnectionPool(backend=SQLiteBackend(str(tmp_path / 'replica.db')))
+    create_schema(replica)
+    with replica.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("INSERT INTO `chats` (`user_id`, `role_id`, `content`) VALUES (1, 1, 'replica')")
+    return replica
+
+
+def routed(pool, replica, pin_window: float) -> ChatHistoryRepositoryImplementation:
+    return ChatHistoryRepositoryImplementation(pool=ReplicaRouter(pool, [replica], pin_window=pin_window))
+
+
+def contents(chats) -> list[str]:
+    return [chat.content for chat in chats or []]
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(pool, replica):
+    chats = routed(pool, replica, pin_window=0)
+    chats.add(make_chat(1, 'primary'))
+
+    assert contents(chats.get_all()) == ['replica']
+    assert contents(chats.get_by(user_id=1)) == ['replica']
+    with UnitOfWork(chats._pool):
+        assert contents(chats.get_all()) == ['primary']
+
+
+def test_reads_are_pinned_to_the_primary_after_a_write(pool, replica):
+    chats = routed(pool, replica, pin_window=60)
+    assert contents(chats.get_all()) == ['replica']
+
+    chats.add(make_chat(1, 'primary'))
+    assert contents(chats.get_all()) == ['primary']
+
+
+def test_purge_reads_from_the_primary(pool, replica):
+    chats = routed(pool, replica, pin_window=0)
+    for index in range(5):
+        chats.add(make_chat(1, f'm{index}'))
+
+    archived = []
+    assert chats.purge_older_than('2999-01-01', batch_size=2, pause=0, archive=archived.extend) == 5
+    assert contents(archived) == [f'm{index}' for index in range(5)]
+    assert ChatHistoryRepositoryImplementation(pool=pool).get_all() is None
+    assert contents(chats.get_all()) == ['replica']
+
+
+def test_negative_pin_window_is_rejected(pool):
+    with pytest.raises(ValueError):
+        ReplicaRouter(pool, pin_window=-1)
@@ -0,0 +1,44 @@
+from expenses_persistence import ConnectionPool
+from expenses_persistence import SQLiteBackend
+from expenses_persistence import create_indexes
+from expenses_persistence.__main__ import main
+from expenses_persistence.schema import check_schema
+
+
+def test_every_access_path_uses_an_index(pool):
+    results = check_schema(pool)
+    assert {'expenses.get_by(user_id)', 'chats.get_recent', 'expenses.changes_since'} <= set(results)
+    assert {name: scans for name, scans in results.items() if scans} == {}
+
+
+def test_missing_index_is_reported_and_restored(tmp_path):
+    path = str(tmp_path / 'check.db')
+    assert main(['create', '--backend', 'sqlite', '--sqlite-path', path]) == 0
+    pool = ConnectionPool(backend=SQLiteBackend(path))
+    with pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute('DROP INDEX `idx_chats_user_created`')
+    pool.close()
+
+    # A fresh connection, so no plan is prepared against the old schema.
+    pool = ConnectionPool(backend=SQLiteBackend(path))
+    results = check_schema(pool)
+    assert 'SCAN chats' in results['chats.get_by(user_id)']
+    assert 'USE TEMP B-TREE FOR ORDER BY' in results['chats.get_recent']
+    assert results['expenses.get_by(user_id)'] == []
+
+    assert create_indexes(pool) == ['idx_chats_user_created']
+    pool.close()
+
+
+def test_check_command_exit_status(tmp_path, capsys):
+    path = str(tmp_path / 'cli.db')
+    assert main(['create', '--backend', 'sqlite', '--sqlite-path', path]) == 0
+    assert main(['check', '--backend', 'sqlite', '--sqlite-path', path]) == 0
+    assert 'ok    chats.get_recent' in capsys.readouterr().out
+
+    pool = ConnectionPool(backend=SQLiteBackend(path))
+    with pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute('DROP INDEX `idx_expenses_category`')
+    pool.close()
+    assert main(['check', '--backend', 'sqlite', '--sqlite-path', path]) == 1
+    assert 'SLOW  expenses.get_by(exp_category_id)' in capsys.readouterr().out
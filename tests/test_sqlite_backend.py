@@ -0,0 +1,46 @@
+from conftest import make_chat
+from expenses_persistence import ChatHistoryRepositoryImplementation
+from expenses_persistence import ConnectionPool
+from expenses_persistence import SQLiteBackend
+from expenses_persistence import create_indexes
+from expenses_persistence import create_schema
+
+
+def test_placeholders_and_percent_literals(pool):
+    with pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT '100%%', %s", (1,))
+        assert cursor.fetchone() == ('100%', 1)
+
+
+def test_multi_row_insert_reports_the_first_id(pool):
+    with pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("INSERT INTO `users` (`username`, `password`) VALUES ('a', 'x'), ('b', 'x'), ('c', 'x')")
+        assert cursor.rowcount == 3
+        assert cursor.lastrowid == 1
+
+
+def test_schema_bootstrap_is_idempotent(pool):
+    create_schema(pool)
+    assert create_indexes(pool) == []
+
+
+def test_repository_round_trip(chats):
+    chat_id = chats.add(make_chat(1, 'hello', role_id=2))
+
+    chat = chats.get(chat_id)
+    assert (chat.chat_id, chat.user_id, chat.role_id, chat.content, chat.status) == (chat_id, 1, 2, 'hello', 1)
+    assert chat.created_at is not None
+    assert chats.get(chat_id + 1) is None
+    assert [chat.content for chat in chats.get_by(user_id=1)] == ['hello']
+    assert chats.get_by(user_id=2) is None
+
+
+def test_in_memory_database_keeps_one_connection():
+    pool = ConnectionPool(backend=SQLiteBackend(':memory:'), min_size=0, max_size=8, max_idle=0)
+    create_schema(pool)
+    chats = ChatHistoryRepositoryImplementation(pool=pool)
+    chats.add(make_chat(1, 'kept'))
+
+    assert chats.get(1).content == 'kept'
+    stats = pool.stats()
+    assert (stats.min_size, stats.max_size, stats.created) == (1, 1, 1)
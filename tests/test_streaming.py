@@ -0,0 +1,46 @@
+from conftest import make_chat
+from expenses_persistence import ChatHistoryRepositoryImplementation
+from expenses_persistence import ConnectionPool
+from expenses_persistence import PoolError
+from expenses_persistence import SQLiteBackend
+from expenses_persistence import UnitOfWork
+from expenses_persistence import create_schema
+
+import pytest
+
+
+def test_iter_all_and_iter_by(chats):
+    chats.add_batch([make_chat(1 + index % 2, f'm{index}') for index in range(5)])
+
+    assert [chat.content for chat in chats.iter_all(chunk_size=2)] == [f'm{index}' for index in range(5)]
+    assert [chat.content for chat in chats.iter_by(chunk_size=2, user_id=2)] == ['m1', 'm3']
+    assert [len(chunk) for chunk in chats.iter_all(chunk_size=2, chunked=True)] == [2, 2, 1]
+    assert list(chats.iter_by(user_id=3)) == []
+
+
+def test_stream_returns_its_connection_when_closed_early(pool, chats):
+    chats.add_batch([make_chat(1, f'm{index}') for index in range(5)])
+
+    stream = chats.iter_all(chunk_size=2)
+    next(stream)
+    assert pool.stats().in_use == 1
+    stream.close()
+    assert pool.stats().in_use == 0
+
+
+def test_nested_query_inside_a_stream_fails_fast(tmp_path):
+    pool = ConnectionPool(backend=SQLiteBackend(str(tmp_path / 'stream.db')), max_size=1, timeout=5)
+    create_schema(pool)
+    chats = ChatHistoryRepositoryImplementation(pool=pool)
+    chats.add_batch([make_chat(1, f'm{index}') for index in range(3)])
+
+    with pytest.raises(PoolError, match='checked out by this thread'):
+        for chat in chats.iter_all(chunk_size=2):
+            chats.get(chat.chat_id)
+
+    with UnitOfWork(pool):
+        with pytest.raises(PoolError, match='still streaming'):
+            for chat in chats.iter_all(chunk_size=2):
+                chats.get(chat.chat_id)
+        assert len(list(chats.iter_all())) == 3
+        assert chats.get(1).content == 'm0'
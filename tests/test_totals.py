@@ -0,0 +1,43 @@
+from conftest import make_expense
+from expenses_persistence import ExpenseRepositoryImplementation
+
+import pytest
+
+
+@pytest.fixture
+def expenses(categorised):
+    with categorised.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("INSERT INTO `users` (`username`, `password`) VALUES ('other', 'secret')")
+        cursor.execute("INSERT INTO `expense_categories` (`category_name`) VALUES ('rent')")
+    repository = ExpenseRepositoryImplementation(pool=categorised)
+    repository.add_batch([make_expense('lunch', amount=12.5), make_expense('dinner', amount=20, month_year='2024-02'),
+                          make_expense('flat', amount=500, month_year='2024-02', category_id=2),
+                          make_expense('theirs', user_id=2, amount=7)])
+    yield repository
+    repository.close()
+
+
+def rows(totals) -> list[tuple]:
+    return [(total.month_year, total.exp_category_id, float(total.total), total.count, float(total.average))
+            for total in totals]
+
+
+def test_totals_by_month(expenses):
+    assert rows(expenses.totals(user_id=1)) == [('2024-01', None, 12.5, 1, 12.5), ('2024-02', None, 520, 2, 260)]
+    assert rows(expenses.totals(user_id=1, month_from='2024-01', month_to='2024-01')) == [
+        ('2024-01', None, 12.5, 1, 12.5)]
+
+
+def test_totals_by_category_and_overall(expenses):
+    assert rows(expenses.totals(group_by=('exp_category_id',), user_id=1)) == [(None, 1, 32.5, 2, 16.25),
+                                                                               (None, 2, 500, 1, 500)]
+    assert rows(expenses.totals(group_by=('month_year', 'exp_category_id'), month_from='2024-02')) == [
+        ('2024-02', 1, 20, 1, 20), ('2024-02', 2, 500, 1, 500)]
+    assert rows(expenses.totals(group_by=())) == [(None, None, 539.5, 4, 134.875)]
+    assert expenses.totals(user_id=3) == []
+    assert expenses.totals(group_by=(), user_id=3) == []
+
+
+def test_totals_rejects_unknown_groupings(expenses):
+    with pytest.raises(ValueError):
+        expenses.totals(group_by=('user_id',))
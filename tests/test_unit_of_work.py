@@ -0,0 +1,61 @@
+from conftest import make_chat
+from conftest import make_expense
+from expenses_persistence import ExpenseRepositoryImplementation
+from expenses_persistence import UnitOfWork
+from expenses_persistence.unit_of_work import after_commit
+
+import pytest
+
+
+def test_unit_of_work_shares_one_connection_and_rolls_back(pool, chats):
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(pool) as unit:
+            chats.add(make_chat(1, 'discarded'))
+            with pool.connection() as connection:
+                assert connection is unit.connection
+            raise RuntimeError('abort')
+
+    assert chats.get_all() is None
+    assert pool.stats().in_use == 0
+
+
+def test_writes_across_repositories_commit_together(categorised, chats):
+    expenses = ExpenseRepositoryImplementation(pool=categorised)
+
+    with expenses.transaction():
+        expense_id = expenses.add(make_expense('lunch'))
+        chats.add(make_chat(1, 'logged lunch'))
+        # Reads inside the unit of work see its uncommitted writes.
+        assert expenses.get(expense_id).expense_name == 'lunch'
+
+    assert expenses.get(expense_id).expense_name == 'lunch'
+    assert [chat.content for chat in chats.get_all()] == ['logged lunch']
+
+
+def test_nested_unit_of_work_joins_the_outer_one(pool, chats):
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(pool):
+            with chats.transaction():
+                chats.add(make_chat(1, 'inner'))
+            chats.add(make_chat(1, 'outer'))
+            raise RuntimeError('abort')
+
+    assert chats.get_all() is None
+
+
+def test_after_commit_callbacks_run_only_on_commit(pool):
+    calls = []
+    with UnitOfWork(pool) as unit:
+        after_commit(unit.connection, lambda: calls.append('committed'))
+        assert calls == []
+    assert calls == ['committed']
+
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(pool) as unit:
+            after_commit(unit.connection, lambda: calls.append('rolled back'))
+            raise RuntimeError('abort')
+    assert calls == ['committed']
+
+    with pool.connection() as connection:
+        after_commit(connection, lambda: calls.append('immediate'))
+    assert calls == ['committed', 'immediate']
@@ -0,0 +1,120 @@
+from conftest import make_chat
+from expenses_persistence import BufferFullError
+from expenses_persistence import ChatWriteBuffer
+
+import logging
+import pytest
+import threading
+import time
+
+
+class RecordingRepository:
+    # Stands in for ChatHistoryRepositoryImplementation; add_batch blocks
+    # while the gate is closed and fails while error is set.
+    def __init__(self):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.error = None
+
+    def add_batch(self, chats):
+        self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        self.batches.append([chat.content for chat in chats])
+        return len(chats)
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def repository():
+    return RecordingRepository()
+
+
+def test_writes_reach_the_database(chats):
+    with ChatWriteBuffer(chats, max_batch=2) as buffer:
+        for index in range(3):
+            buffer.put(make_chat(1, f'm{index}'))
+        assert buffer.flush(timeout=2)
+        assert [chat.content for chat in chats.get_all()] == ['m0', 'm1', 'm2']
+        assert (buffer.written, buffer.pending) == (3, 0)
+
+
+def test_a_full_batch_is_written_at_once(repository):
+    with ChatWriteBuffer(repository, max_batch=3, max_delay=60) as buffer:
+        for index in range(3):
+            buffer.put(make_chat(1, f'm{index}'))
+        assert wait_for(lambda: repository.batches)
+        assert repository.batches == [['m0', 'm1', 'm2']]
+
+
+def test_an_idle_writer_flushes_a_single_chat_after_max_delay(repository):
+    with ChatWriteBuffer(repository, max_batch=100, max_delay=0.2) as buffer:
+        # Let the writer go idle on the empty queue first.
+        time.sleep(0.05)
+        buffer.put(make_chat(1, 'alone'))
+        time.sleep(0.01)
+        assert repository.batches == []
+        assert wait_for(lambda: repository.batches, timeout=1)
+        assert repository.batches == [['alone']]
+
+
+def test_a_full_buffer_applies_backpressure(repository):
+    repository.gate.clear()
+    with ChatWriteBuffer(repository, max_batch=1, max_pending=2) as buffer:
+        buffer.put(make_chat(1, 'm0'))
+        buffer.put(make_chat(1, 'm1'))
+        with pytest.raises(BufferFullError):
+            buffer.put(make_chat(1, 'm2'), timeout=0.05)
+        assert not buffer.flush(timeout=0.05)
+
+        repository.gate.set()
+        buffer.put(make_chat(1, 'm2'), timeout=2)
+        assert buffer.flush(timeout=2)
+        assert repository.batches == [['m0'], ['m1'], ['m2']]
+
+
+def test_close_writes_what_is_queued(repository):
+    buffer = ChatWriteBuffer(repository, max_batch=100, max_delay=60)
+    buffer.put(make_chat(1, 'm0'))
+    buffer.put(make_chat(1, 'm1'))
+    buffer.close(timeout=2)
+
+    assert repository.batches == [['m0', 'm1']]
+    with pytest.raises(RuntimeError, match='closed'):
+        buffer.put(make_chat(1, 'late'))
+
+
+def test_failed_batches_go_to_on_error(repository, caplog):
+    failures = []
+    repository.error = RuntimeError('database down')
+
+    with ChatWriteBuffer(repository, on_error=lambda batch, error: failures.append((len(batch), error))) as buffer:
+        buffer.put(make_chat(1, 'lost'))
+        assert buffer.flush(timeout=2)
+        assert buffer.failed == 1
+    assert failures == [(1, repository.error)]
+
+    def broken(batch, error):
+        raise ValueError('on_error failed')
+
+    with caplog.at_level(logging.ERROR, logger='expenses_persistence.write_behind'):
+        with ChatWriteBuffer(repository, on_error=broken) as buffer:
+            buffer.put(make_chat(1, 'lost'))
+            assert buffer.flush(timeout=2)
+    assert 'on_error callback failed for 1 buffered chats' in caplog.text
+
+
+def test_invalid_settings(repository):
+    with pytest.raises(ValueError):
+        ChatWriteBuffer(repository, max_batch=10, max_pending=5)
+    with pytest.raises(ValueError):
+        ChatWriteBuffer(repository, max_delay=0)